@@ -5,6 +5,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from json_utils import SocketIOJSON, ORJSON_AVAILABLE
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -21,20 +22,39 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///forex_bot.db")
+is_sqlite = app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
-    "pool_pre_ping": True,
+    # A SELECT 1 on every checkout; opt in with DB_PREPING=1 if keepalives aren't enough
+    "pool_pre_ping": not is_sqlite and os.environ.get("DB_PREPING") == "1",
 }
+if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgres"):
+    # Let TCP keepalives detect dead server connections instead of pre-ping
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+    }
 
 # Initialize extensions
 db.init_app(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', 
-                   engineio_logger=False, logger=False, ping_timeout=60, ping_interval=25)
+# Encode Socket.IO packets with orjson when it is installed
+socketio_options = {"json": SocketIOJSON} if ORJSON_AVAILABLE else {}
+# eventlet serves each WebSocket client from a green thread instead of an OS
+# thread; SOCKETIO_ASYNC_MODE can select another server (e.g. gevent)
+socketio = SocketIO(app, cors_allowed_origins="*",
+                   async_mode=os.environ.get("SOCKETIO_ASYNC_MODE", "eventlet"),
+                   engineio_logger=False, logger=False,
+                   ping_timeout=int(os.environ.get("SOCKETIO_PING_TIMEOUT", 60)),
+                   ping_interval=int(os.environ.get("SOCKETIO_PING_INTERVAL", 25)),
+                   **socketio_options)
 
 with app.app_context():
     # Import models to create tables
     import models
     db.create_all()
+    models.create_missing_indexes()
 
 # Import routes
 import routes
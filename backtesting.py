@@ -1,7 +1,16 @@
+import gc
+import hashlib
+import json
+import os
 import pandas as pd
 import numpy as np
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from jit_utils import njit, NUMBA_AVAILABLE
 
 try:
     import MetaTrader5 as mt5
@@ -10,28 +19,190 @@ except ImportError:
     MT5_AVAILABLE = False
     
 try:
-    from strategy import get_signal
+    from strategy import get_signals
     from risk_manager import get_dynamic_sltp
 except ImportError:
     # Mock functions for development
-    def get_signal(data, strategy):
-        return None
+    def get_signals(data, strategy):
+        return np.zeros(len(data), dtype=np.int8)
     
     def get_dynamic_sltp(symbol, entry_price, trade_type, balance):
         return None, None
 
+# Bars skipped at the start so indicators have enough history
+WARMUP_BARS = 50
+
+# Rate fields read by the simulation (time, high/low/close) and the
+# strategies (close, tick_volume); open, spread and real_volume are dropped
+_BACKTEST_FIELDS = ('time', 'high', 'low', 'close', 'tick_volume')
+
+# Historical rates for completed date ranges, saved as the raw MT5 arrays
+_BAR_CACHE_DIR = Path(os.environ.get("BACKTEST_CACHE_DIR", ".bar_cache"))
+
+def _bar_cache_path(symbol, timeframe, start_date, end_date):
+    key = hashlib.md5(f"{symbol}|{timeframe}|{start_date.isoformat()}|{end_date.isoformat()}".encode()).hexdigest()
+    return _BAR_CACHE_DIR / f"{key}.npy"
+
+@dataclass(frozen=True, slots=True)
+class _SymbolInfo:
+    """The symbol_info() fields a backtest needs, kept beside the cached bars
+    
+    MT5 is disconnected by the time trades are simulated, so get_dynamic_sltp
+    gets these instead of querying the terminal.
+    """
+    point: float
+    digits: int
+
+# Trade fields holding unix seconds, formatted as ISO 8601 UTC in results
+_TRADE_TIME_FIELDS = ('open_time', 'close_time')
+
+def _iso_times(seconds):
+    """ISO 8601 UTC strings for unix seconds (a scalar or a sequence)"""
+    return np.datetime_as_string(np.asarray(seconds, dtype='datetime64[s]'), timezone='UTC').tolist()
+
+@lru_cache(maxsize=None)
+def _pip_size(symbol):
+    """Estimated pip size for a symbol (simplified)"""
+    if 'XAU' in symbol or 'GOLD' in symbol or 'JPY' in symbol:
+        return 0.01
+    return 0.0001
+
+# First window of closes compared at once when scanning for an exit without numba
+_EXIT_SCAN_CHUNK = 256
+
+# Exit codes returned by the exit scan
+_EXIT_SL = 1
+_EXIT_TP = 2
+
+@njit(cache=True)
+def _scan_exit(close32, close, start, sl, tp, is_buy):
+    """First close from ``start`` on that reaches SL or TP
+    
+    Scans the float32 copy of the closes and confirms candidates against
+    the float64 prices. Rounding is monotonic, so the float32 test never
+    misses a real hit. Returns ``(index, code)`` with code _EXIT_SL or
+    _EXIT_TP (SL wins if both are hit), or ``(-1, 0)``.
+    """
+    sl32 = np.float32(sl)
+    tp32 = np.float32(tp)
+    for j in range(start, len(close32)):
+        price32 = close32[j]
+        if is_buy:
+            if price32 <= sl32 or price32 >= tp32:
+                price = close[j]
+                if price <= sl:
+                    return j, 1
+                if price >= tp:
+                    return j, 2
+        elif price32 >= sl32 or price32 <= tp32:
+            price = close[j]
+            if price >= sl:
+                return j, 1
+            if price <= tp:
+                return j, 2
+    return -1, 0
+
+@dataclass(slots=True)
+class _OpenTrade:
+    """A simulated trade while it is open"""
+    type: str
+    entry_price: float
+    sl: float
+    tp: float
+    volume: float
+    open_time: int
+    symbol: str
+    point: float
+
+def _run_one_backtest(config):
+    """Run a single backtest in a worker process
+    
+    ``config`` holds run_backtest() keyword arguments. The per-bar balance
+    history is dropped to keep what is sent back to the parent small.
+    """
+    try:
+        result = BacktestEngine().run_backtest(**config)
+        result.pop('balance_history', None)
+        return result
+    except Exception as e:
+        logging.error(f"Backtest failed for {config}: {e}")
+        return {'error': str(e)}
+    finally:
+        gc.collect()
+
 class BacktestEngine:
     def __init__(self):
         self.trades = []
-        self.balance_history = []
+        self._reset_balance_history()
         self.drawdowns = []
+        self.columnar = False
     
-    def run_backtest(self, strategy, symbol, timeframe, start_date, end_date, initial_balance=10000):
-        """Run a comprehensive backtest"""
+    def _reset_balance_history(self):
+        # Balance after each simulated bar, kept as parallel columns
+        # (bar times as unix seconds)
+        self.balance_times = np.empty(0, dtype=np.int64)
+        self.balances = np.empty(0, dtype=np.float64)
+    
+    def run_backtest(self, strategy, symbol, timeframe, start_date, end_date, initial_balance=10000,
+                     columnar=False):
+        """Run a comprehensive backtest
+        
+        With ``columnar=True`` the trades and balance history are returned
+        as {field: [values]} columns instead of one dict per row.
+        """
         self.trades = []
-        self.balance_history = []
+        self._reset_balance_history()
         self.drawdowns = []
+        self.columnar = columnar
+        
+        rates, symbol_info = self._load_rates(symbol, timeframe, start_date, end_date)
+        
+        # Only the fields the simulation and strategies read
+        df = pd.DataFrame({field: rates[field] for field in _BACKTEST_FIELDS if field in rates.dtype.names})
+        
+        # Run the backtest
+        return self._simulate_trades(df, strategy, symbol, initial_balance, symbol_info)
+    
+    def _load_rates(self, symbol, timeframe, start_date, end_date):
+        """Historical rates and symbol info from the disk cache, fetched from MT5 on a miss
+        
+        Only ranges that ended in the past are cached, since later bars of
+        an open range are still to come. Caches written without symbol
+        info are treated as misses.
+        """
+        cache_path = _bar_cache_path(symbol, timeframe, start_date, end_date)
+        info_path = cache_path.with_suffix('.json')
+        if cache_path.exists() and info_path.exists():
+            try:
+                with open(info_path, 'r') as f:
+                    info = json.load(f)
+                symbol_info = _SymbolInfo(**info) if info else None
+                return np.load(cache_path, mmap_mode='r'), symbol_info
+            except (OSError, ValueError, TypeError) as e:
+                logging.warning(f"Ignoring unreadable bar cache {cache_path}: {e}")
+        
+        rates, symbol_info = self._fetch_rates(symbol, timeframe, start_date, end_date)
         
+        if end_date < datetime.now(end_date.tzinfo):
+            try:
+                _BAR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix('.tmp')
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, rates)
+                os.replace(tmp_path, cache_path)
+                
+                # Written last, so a cache hit always has both files
+                info = {'point': symbol_info.point, 'digits': symbol_info.digits} if symbol_info else None
+                with open(tmp_path, 'w') as f:
+                    json.dump(info, f)
+                os.replace(tmp_path, info_path)
+            except OSError as e:
+                logging.warning(f"Could not write bar cache {cache_path}: {e}")
+        
+        return rates, symbol_info
+    
+    def _fetch_rates(self, symbol, timeframe, start_date, end_date):
+        """Fetch historical rates and the symbol's point and digits from MT5"""
         # Initialize MT5 for data retrieval
         if not MT5_AVAILABLE:
             raise RuntimeError("MetaTrader5 not available for backtesting")
@@ -42,95 +213,168 @@ class BacktestEngine:
         try:
             # Get historical data
             timeframe_mt5 = getattr(mt5, f"TIMEFRAME_{timeframe}")
-            
-            # Calculate number of bars needed
-            days_diff = (end_date - start_date).days
-            bars_needed = max(1000, days_diff * 48)  # Estimate bars per day
-            
             rates = mt5.copy_rates_range(symbol, timeframe_mt5, start_date, end_date)
             
             if rates is None or len(rates) == 0:
                 raise ValueError(f"No historical data available for {symbol}")
             
-            df = pd.DataFrame(rates)
-            df['time'] = pd.to_datetime(df['time'], unit='s')
+            # Read while connected; the simulation runs after shutdown
+            info = mt5.symbol_info(symbol)
+            symbol_info = _SymbolInfo(point=info.point, digits=info.digits) if info else None
             
-            # Run the backtest
-            result = self._simulate_trades(df, strategy, symbol, initial_balance)
-            
-            return result
+            return rates, symbol_info
             
         finally:
             mt5.shutdown()
     
-    def _simulate_trades(self, df, strategy, symbol, initial_balance):
-        """Simulate trading with the given strategy"""
+    def run_batch(self, configs, max_workers=None, chunksize=10):
+        """Run independent backtests in parallel processes
+        
+        Each config is a dict of run_backtest() keyword arguments; results
+        come back in the same order, with {'error': ...} for failed runs.
+        """
+        configs = list(configs)
+        if not configs:
+            return []
+        
+        max_workers = min(max_workers or os.cpu_count() or 1, len(configs))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_run_one_backtest, configs, chunksize=chunksize))
+    
+    def _simulate_trades(self, df, strategy, symbol, initial_balance, symbol_info=None):
+        """Simulate trading with the given strategy
+        
+        Signals for all bars are computed up front, and only one trade is
+        open at a time, so the simulation jumps from an entry straight to
+        the bar where its SL/TP is hit and then to the next signal.
+        
+        ``df['time']`` holds unix seconds, as returned by MT5; times stay
+        integers until the results are formatted.
+        """
+        n = len(df)
+        close = df['close'].to_numpy(dtype=np.float64)
+        close32 = close.astype(np.float32)  # half the bytes for the exit scans
+        times = df['time'].to_numpy(dtype=np.int64)
+        
+        # Columns get_dynamic_sltp reads, as one record array so each trade
+        # gets an O(1) prefix view instead of a DataFrame slice
+        history = np.rec.fromarrays(
+            [df['high'].to_numpy(dtype=np.float64), df['low'].to_numpy(dtype=np.float64), close],
+            names='high,low,close'
+        )
+        
+        def bar(idx):
+            return {'time': times[idx], 'close': close[idx]}
+        
         balance = initial_balance
-        equity = initial_balance
-        peak_balance = initial_balance
         max_drawdown = 0
-        open_trades = []
         
-        self.balance_history.append({'time': df.iloc[0]['time'], 'balance': balance})
+        self.balance_times = times[:1]
+        self.balances = np.array([initial_balance], dtype=np.float64)
+        if n <= WARMUP_BARS:
+            return self._calculate_metrics(initial_balance, balance, max_drawdown)
         
-        for i in range(50, len(df)):  # Start after enough data for indicators
-            current_data = df.iloc[:i+1]
-            current_bar = df.iloc[i]
-            
-            # Get trading signal
-            signal = get_signal(current_data, strategy)
-            
-            # Close existing trades if conditions are met
-            for trade in open_trades[:]:  # Use slice copy to modify list during iteration
-                trade_result = self._check_trade_exit(trade, current_bar, current_data)
-                if trade_result:
-                    balance += trade_result['profit']
-                    equity = balance
-                    
-                    trade_result['close_time'] = current_bar['time']
-                    trade_result['balance_after'] = balance
-                    self.trades.append(trade_result)
-                    open_trades.remove(trade)
-            
-            # Open new trade if signal and no existing trades
-            if signal in ['buy', 'sell'] and len(open_trades) == 0:
-                trade = self._open_trade(signal, current_bar, current_data, symbol, balance)
-                if trade:
-                    open_trades.append(trade)
+        signals = get_signals(df, strategy)
+        entries = np.flatnonzero(signals[WARMUP_BARS:]) + WARMUP_BARS
+        
+        # Realized profit per bar, starting from the initial balance
+        balance_steps = np.zeros(n - WARMUP_BARS + 1)
+        balance_steps[0] = initial_balance
+        
+        i = WARMUP_BARS
+        while True:
+            # Next bar with a signal while flat (a trade may open on the bar another closed)
+            k = np.searchsorted(entries, i)
+            if k == len(entries):
+                break
+            i = entries[k]
             
-            # Update balance history and drawdown
-            self.balance_history.append({'time': current_bar['time'], 'balance': balance})
+            signal = 'buy' if signals[i] > 0 else 'sell'
+            trade = self._open_trade(signal, bar(i), history[:i + 1], symbol, balance, symbol_info)
+            if not trade:
+                i += 1
+                continue
             
-            if balance > peak_balance:
-                peak_balance = balance
+            exit_idx, exit_code = self._find_trade_exit(trade, close32, close, i)
+            if exit_idx is None:
+                # Close any remaining open trade
+                trade_result = self._force_close_trade(trade, bar(n - 1))
+                balance += trade_result['profit']
+                self.trades.append(trade_result)
+                break
             
-            current_drawdown = (peak_balance - balance) / peak_balance * 100
-            if current_drawdown > max_drawdown:
-                max_drawdown = current_drawdown
-        
-        # Close any remaining open trades
-        for trade in open_trades:
-            final_bar = df.iloc[-1]
-            trade_result = self._force_close_trade(trade, final_bar)
+            if exit_code == _EXIT_SL:
+                trade_result = self._close_trade(trade, trade.sl, 'SL')
+            else:
+                trade_result = self._close_trade(trade, trade.tp, 'TP')
             balance += trade_result['profit']
+            balance_steps[exit_idx - WARMUP_BARS + 1] = trade_result['profit']
+            
+            trade_result['close_time'] = times[exit_idx]
+            trade_result['balance_after'] = balance
             self.trades.append(trade_result)
+            i = exit_idx
+        
+        # Balance after each bar and the drawdown from its running peak
+        balances = np.cumsum(balance_steps)[1:]
+        peaks = np.maximum(initial_balance, np.maximum.accumulate(balances))
+        drawdowns = (peaks - balances) / peaks * 100
+        max_drawdown = max(max_drawdown, float(drawdowns.max()))
+        
+        self.balance_times = np.concatenate((self.balance_times, times[WARMUP_BARS:]))
+        self.balances = np.concatenate((self.balances, balances))
         
         # Calculate performance metrics
         return self._calculate_metrics(initial_balance, balance, max_drawdown)
     
-    def _open_trade(self, signal, bar, data, symbol, balance):
+    def _find_trade_exit(self, trade, close32, close, entry_idx):
+        """First bar after entry whose close reaches SL or TP
+        
+        Returns ``(index, exit_code)``, or ``(None, 0)`` if the trade is
+        still open at the end of the data.
+        """
+        is_buy = trade.type == 'buy'
+        sl, tp = float(trade.sl), float(trade.tp)
+        
+        if NUMBA_AVAILABLE:
+            exit_idx, exit_code = _scan_exit(close32, close, entry_idx + 1, sl, tp, is_buy)
+            return (None, 0) if exit_idx < 0 else (int(exit_idx), int(exit_code))
+        
+        # Compare growing float32 windows so a quick exit doesn't scan the
+        # whole tail, then confirm the candidates at full precision
+        sl32, tp32 = np.float32(sl), np.float32(tp)
+        start, size = entry_idx + 1, _EXIT_SCAN_CHUNK
+        while start < len(close32):
+            window = close32[start:start + size]
+            if is_buy:
+                candidates = np.flatnonzero((window <= sl32) | (window >= tp32))
+            else:
+                candidates = np.flatnonzero((window >= sl32) | (window <= tp32))
+            
+            if len(candidates):
+                prices = close[start + candidates]
+                if is_buy:
+                    conditions = [prices <= sl, prices >= tp]
+                else:
+                    conditions = [prices >= sl, prices <= tp]
+                codes = np.select(conditions, [_EXIT_SL, _EXIT_TP], 0)
+                hits = np.flatnonzero(codes)
+                if len(hits):
+                    return start + int(candidates[hits[0]]), int(codes[hits[0]])
+            start += size
+            size *= 2
+        return None, 0
+    
+    def _open_trade(self, signal, bar, data, symbol, balance, symbol_info=None):
         """Open a new trade"""
         # Get dynamic SL/TP
-        sl_pips, tp_pips = get_dynamic_sltp(data, symbol)
+        sl_pips, tp_pips = get_dynamic_sltp(data, symbol, symbol_info=symbol_info)
         
         # Simulate position sizing (1% risk)
         risk_percent = 1.0
         risk_amount = balance * (risk_percent / 100)
         
-        # Estimate point value (simplified)
-        point = 0.0001 if 'JPY' not in symbol else 0.01
-        if 'XAU' in symbol or 'GOLD' in symbol:
-            point = 0.01
+        point = _pip_size(symbol)
         
         # Calculate volume based on risk
         sl_in_price = sl_pips * point
@@ -145,76 +389,41 @@ class BacktestEngine:
             sl_price = entry_price + (sl_pips * point)
             tp_price = entry_price - (tp_pips * point)
         
-        trade = {
-            'type': signal,
-            'entry_price': entry_price,
-            'sl': sl_price,
-            'tp': tp_price,
-            'volume': volume,
-            'open_time': bar['time'],
-            'symbol': symbol,
-            'point': point
-        }
-        
-        return trade
+        return _OpenTrade(
+            type=signal,
+            entry_price=entry_price,
+            sl=sl_price,
+            tp=tp_price,
+            volume=volume,
+            open_time=bar['time'],
+            symbol=symbol,
+            point=point
+        )
     
-    def _check_trade_exit(self, trade, bar, data):
-        """Check if trade should be closed"""
-        current_price = bar['close']
-        
-        # Check SL/TP
-        if trade['type'] == 'buy':
-            if current_price <= trade['sl'] or current_price >= trade['tp']:
-                exit_price = trade['sl'] if current_price <= trade['sl'] else trade['tp']
-                profit = (exit_price - trade['entry_price']) * trade['volume'] * 100000
-                return {
-                    'type': trade['type'],
-                    'entry_price': trade['entry_price'],
-                    'exit_price': exit_price,
-                    'profit': profit,
-                    'volume': trade['volume'],
-                    'symbol': trade['symbol'],
-                    'open_time': trade['open_time'],
-                    'exit_reason': 'SL' if current_price <= trade['sl'] else 'TP'
-                }
-        else:  # sell
-            if current_price >= trade['sl'] or current_price <= trade['tp']:
-                exit_price = trade['sl'] if current_price >= trade['sl'] else trade['tp']
-                profit = (trade['entry_price'] - exit_price) * trade['volume'] * 100000
-                return {
-                    'type': trade['type'],
-                    'entry_price': trade['entry_price'],
-                    'exit_price': exit_price,
-                    'profit': profit,
-                    'volume': trade['volume'],
-                    'symbol': trade['symbol'],
-                    'open_time': trade['open_time'],
-                    'exit_reason': 'SL' if current_price >= trade['sl'] else 'TP'
-                }
-        
-        return None
-    
-    def _force_close_trade(self, trade, bar):
-        """Force close trade at the end of backtest"""
-        exit_price = bar['close']
-        
-        if trade['type'] == 'buy':
-            profit = (exit_price - trade['entry_price']) * trade['volume'] * 100000
+    def _close_trade(self, trade, exit_price, exit_reason):
+        """Closed-trade record for ``trade`` exiting at ``exit_price``"""
+        if trade.type == 'buy':
+            profit = (exit_price - trade.entry_price) * trade.volume * 100000
         else:
-            profit = (trade['entry_price'] - exit_price) * trade['volume'] * 100000
+            profit = (trade.entry_price - exit_price) * trade.volume * 100000
         
         return {
-            'type': trade['type'],
-            'entry_price': trade['entry_price'],
+            'type': trade.type,
+            'entry_price': trade.entry_price,
             'exit_price': exit_price,
             'profit': profit,
-            'volume': trade['volume'],
-            'symbol': trade['symbol'],
-            'open_time': trade['open_time'],
-            'close_time': bar['time'],
-            'exit_reason': 'End of backtest'
+            'volume': trade.volume,
+            'symbol': trade.symbol,
+            'open_time': trade.open_time,
+            'exit_reason': exit_reason
         }
     
+    def _force_close_trade(self, trade, bar):
+        """Force close trade at the end of backtest"""
+        trade_result = self._close_trade(trade, bar['close'], 'End of backtest')
+        trade_result['close_time'] = bar['time']
+        return trade_result
+    
     def _calculate_metrics(self, initial_balance, final_balance, max_drawdown):
         """Calculate comprehensive performance metrics"""
         if not self.trades:
@@ -231,18 +440,21 @@ class BacktestEngine:
                 'sharpe_ratio': 0,
                 'avg_win': 0,
                 'avg_loss': 0,
-                'trades': []
+                'trades': self._trades_output()
             }
         
         total_trades = len(self.trades)
-        winning_trades = len([t for t in self.trades if t['profit'] > 0])
-        losing_trades = len([t for t in self.trades if t['profit'] < 0])
+        profits = np.fromiter((t['profit'] for t in self.trades), dtype=np.float64, count=total_trades)
+        wins_mask = profits > 0
+        loss_mask = profits < 0
+        winning_trades = int(wins_mask.sum())
+        losing_trades = int(loss_mask.sum())
         
         win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
         
         # Calculate profit factor
-        gross_profit = sum([t['profit'] for t in self.trades if t['profit'] > 0])
-        gross_loss = abs(sum([t['profit'] for t in self.trades if t['profit'] < 0]))
+        gross_profit = float(profits[wins_mask].sum())
+        gross_loss = abs(float(profits[loss_mask].sum()))
         profit_factor = gross_profit / gross_loss if gross_loss > 0 else float('inf')
         
         # Calculate average win/loss
@@ -250,16 +462,11 @@ class BacktestEngine:
         avg_loss = gross_loss / losing_trades if losing_trades > 0 else 0
         
         # Calculate Sharpe ratio (simplified)
-        returns = []
-        for i in range(1, len(self.balance_history)):
-            prev_balance = self.balance_history[i-1]['balance']
-            curr_balance = self.balance_history[i]['balance']
-            daily_return = (curr_balance - prev_balance) / prev_balance
-            returns.append(daily_return)
-        
-        if returns:
-            avg_return = np.mean(returns)
-            std_return = np.std(returns)
+        returns = np.diff(self.balances) / self.balances[:-1]
+        
+        if len(returns):
+            avg_return = returns.mean()
+            std_return = returns.std()
             sharpe_ratio = (avg_return / std_return * np.sqrt(252)) if std_return > 0 else 0
         else:
             sharpe_ratio = 0
@@ -281,6 +488,31 @@ class BacktestEngine:
             'avg_loss': round(avg_loss, 2),
             'gross_profit': round(gross_profit, 2),
             'gross_loss': round(gross_loss, 2),
-            'trades': self.trades,
-            'balance_history': self.balance_history
+            'trades': self._trades_output(),
+            'balance_history': self._balance_history_output()
         }
+    
+    def _trades_output(self):
+        """Trades as records, or as columns when running columnar"""
+        if not self.columnar:
+            return [
+                {**trade, **{field: _iso_times(trade[field]) for field in _TRADE_TIME_FIELDS if field in trade}}
+                for trade in self.trades
+            ]
+        
+        fields = {}
+        for trade in self.trades:
+            fields.update(dict.fromkeys(trade))
+        columns = {field: [trade.get(field) for trade in self.trades] for field in fields}
+        for field in _TRADE_TIME_FIELDS:
+            if field in columns:
+                columns[field] = _iso_times(columns[field])
+        return columns
+    
+    def _balance_history_output(self):
+        """Balance history as {'time', 'balance'} records or as two columns"""
+        times = _iso_times(self.balance_times)
+        balances = self.balances.tolist()
+        if self.columnar:
+            return {'time': times, 'balance': balances}
+        return [{'time': t, 'balance': b} for t, b in zip(times, balances)]
@@ -0,0 +1,122 @@
+"""
+In-process state shared by the trading engine, the web routes and the
+WebSocket handlers.
+
+The bot status still lives in control.json so it survives restarts and can be
+edited by hand, but readers get it from memory and only re-read the file when
+its modification time changes; config.json is cached the same way. The latest
+dashboard payload is kept here too, so new WebSocket clients get it without
+going through dashboard_data.json, along with the trade counts the dashboard
+endpoints serve until a trade is saved or closed.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from json_utils import load_json, dump_json
+
+CONTROL_FILE = 'control.json'
+CONFIG_FILE = 'config.json'
+
+_lock = threading.Lock()
+_control = {'status': None, 'mtime': None}
+_config = {'data': None, 'mtime': None}
+_dashboard = {'data': None}
+
+# Trades are only written by this process' trading engine, which invalidates
+# the counts; the age limit covers engines running in another process
+_TRADE_COUNTS_MAX_AGE = 30
+_trade_counts = {'data': None, 'day': None, 'at': 0.0, 'generation': 0}
+
+def _control_mtime():
+    try:
+        return os.stat(CONTROL_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _read_control_file():
+    try:
+        with open(CONTROL_FILE, 'r') as f:
+            return json.load(f).get('status', 'running')
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 'running'
+
+def ensure_control_file():
+    """Create control.json with the running status unless it already exists"""
+    try:
+        fd = os.open(CONTROL_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+    except FileExistsError:
+        return
+    with os.fdopen(fd, 'w') as f:
+        f.write(json.dumps({'status': 'running'}))
+
+def get_control_status():
+    """Get the bot status, re-reading control.json only if it changed"""
+    mtime = _control_mtime()
+    with _lock:
+        if _control['status'] is None or mtime != _control['mtime']:
+            _control['status'] = _read_control_file()
+            _control['mtime'] = mtime
+        return _control['status']
+
+def set_control_status(status, **fields):
+    """Update the bot status in memory and persist it to control.json"""
+    payload = json.dumps({'status': status, **fields})
+    with _lock:
+        with open(CONTROL_FILE, 'w') as f:
+            f.write(payload)
+        _control['status'] = status
+        _control['mtime'] = _control_mtime()
+    logging.info(f"Bot status set to {status}")
+
+def get_config():
+    """Get config.json as a dict, re-reading it only if it changed
+    
+    The dict is shared between callers, so it must not be modified.
+    """
+    mtime = os.stat(CONFIG_FILE).st_mtime_ns
+    with _lock:
+        if _config['data'] is None or mtime != _config['mtime']:
+            _config['data'] = load_json(CONFIG_FILE)
+            _config['mtime'] = mtime
+        return _config['data']
+
+def save_config(config):
+    """Write config.json and keep the written dict as the cached copy"""
+    with _lock:
+        dump_json(CONFIG_FILE, config)
+        _config['data'] = config
+        _config['mtime'] = os.stat(CONFIG_FILE).st_mtime_ns
+
+def publish_dashboard(data):
+    """Store the latest dashboard payload"""
+    with _lock:
+        _dashboard['data'] = data
+
+def get_dashboard():
+    """Get the latest dashboard payload, or None before the first update"""
+    with _lock:
+        return _dashboard['data']
+
+def get_trade_counts(day, compute):
+    """Trade counts for ``day``, calling ``compute()`` only when they may have changed"""
+    now = time.monotonic()
+    with _lock:
+        if (_trade_counts['data'] is not None and _trade_counts['day'] == day
+                and now - _trade_counts['at'] < _TRADE_COUNTS_MAX_AGE):
+            return _trade_counts['data']
+        generation = _trade_counts['generation']
+    
+    data = compute()
+    with _lock:
+        # Don't cache counts computed while a trade was being written
+        if _trade_counts['generation'] == generation:
+            _trade_counts.update(data=data, day=day, at=now)
+    return data
+
+def invalidate_trade_counts():
+    """Forget the cached trade counts after a trade is saved or closed"""
+    with _lock:
+        _trade_counts['data'] = None
+        _trade_counts['generation'] += 1
@@ -1,6 +1,13 @@
 # Gunicorn configuration file for Flask-SocketIO
+import os
+
 bind = "0.0.0.0:5000"
-worker_class = "eventlet"
+# Match the worker to the Socket.IO async mode; gevent needs the
+# gevent-websocket worker (pip install -e .[gevent]) for WebSocket upgrades
+if os.environ.get("SOCKETIO_ASYNC_MODE") == "gevent":
+    worker_class = "geventwebsocket.gunicorn.workers.GeventWebSocketWorker"
+else:
+    worker_class = "eventlet"
 workers = 1
 worker_connections = 1000
 timeout = 120
@@ -0,0 +1,16 @@
+"""
+Optional numba support. ``njit`` compiles with numba when it is installed
+and is a no-op decorator otherwise, so kernels still run as plain Python.
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Run kernels as plain Python when numba isn't installed"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
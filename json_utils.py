@@ -0,0 +1,80 @@
+"""
+Optional orjson support. API responses and JSON files are encoded with
+orjson when it is installed and fall back to the standard library otherwise.
+"""
+import json
+
+from flask import Response, jsonify, stream_with_context
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Encoded list items sent to the client per chunk when streaming
+_STREAM_CHUNK_ITEMS = 200
+
+def dumps(obj, indent=False):
+    """Serialize obj to JSON bytes, optionally indented by two spaces"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=_OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS)
+    return json.dumps(obj, indent=2 if indent else None).encode()
+
+def ojsonify(obj, status=200):
+    """Like flask.jsonify, but serialized with orjson when available"""
+    if not ORJSON_AVAILABLE:
+        response = jsonify(obj)
+        response.status_code = status
+        return response
+    return Response(orjson.dumps(obj, option=_OPTIONS), status=status, mimetype='application/json')
+
+def stream_list_response(key, items, **fields):
+    """Stream ``{key: [*items], **fields}`` as JSON, encoding items as they are consumed
+    
+    ``items`` may be a lazy iterator; it is read inside the request context,
+    so it can keep using the database session.
+    """
+    def generate():
+        chunk = [b'{', dumps(key), b':[']
+        for i, item in enumerate(items):
+            if i:
+                chunk.append(b',')
+            chunk.append(dumps(item))
+            if len(chunk) >= 2 * _STREAM_CHUNK_ITEMS:
+                yield b''.join(chunk)
+                chunk = []
+        chunk.append(b']')
+        for name, value in fields.items():
+            chunk += [b',', dumps(name), b':', dumps(value)]
+        chunk.append(b'}')
+        yield b''.join(chunk)
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+class SocketIOJSON:
+    """orjson-backed json module for SocketIO(json=...), which expects str output"""
+    
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj, option=_OPTIONS).decode()
+    
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+def load_json(path):
+    """Read a JSON file"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def dump_json(path, data):
+    """Write data to a JSON file, indented by two spaces"""
+    with open(path, 'wb') as f:
+        f.write(dumps(data, indent=True))
@@ -1,3 +1,5 @@
+import os
+import sys
 import threading
 import time
 import logging
@@ -10,7 +12,14 @@ def start_trading_engine():
     engine.start()
 
 if __name__ == "__main__":
+    # Only the threading mode falls back to Werkzeug's development server
+    if socketio.async_mode == 'threading' and os.environ.get('DEV') != '1':
+        sys.exit("SOCKETIO_ASYNC_MODE=threading serves through the Werkzeug development server; "
+                 "set DEV=1 to allow it, or use eventlet or gevent")
+    
     # Start trading engine in background
+    # A real thread: this entry point does not monkey-patch, so a green thread
+    # would block the server whenever the engine waits on MT5 or the database
     trading_thread = threading.Thread(target=start_trading_engine, daemon=True)
     trading_thread.start()
     
@@ -1,11 +1,41 @@
+import math
 from datetime import datetime
 from app import db
-from sqlalchemy import func
+from sqlalchemy import func, case, insert, select
+
+# Rows fetched from the database cursor at a time while a page is streamed
+_PAGE_FETCH_SIZE = 200
+
+def _dict_page(columns, criteria, order_by, page, per_page, convert):
+    """One page of rows as plain dicts, with the total row and page counts.
+    
+    Selects only the given columns, so no ORM objects are built per row.
+    Rows are fetched lazily in batches as the returned iterator is consumed,
+    each passed through ``convert``. Out-of-range arguments are clamped the
+    way paginate(error_out=False) does.
+    """
+    page = max(page, 1)
+    per_page = per_page if per_page > 0 else 20
+    
+    total = db.session.scalar(
+        select(func.count()).select_from(columns[0].table).where(*criteria)
+    )
+    
+    def rows():
+        result = db.session.execute(
+            select(*columns).where(*criteria).order_by(order_by)
+            .limit(per_page).offset((page - 1) * per_page)
+            .execution_options(yield_per=_PAGE_FETCH_SIZE)
+        ).mappings()
+        for row in result:
+            yield convert(dict(row))
+    
+    return rows(), total, math.ceil(total / per_page)
 
 class Account(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    login = db.Column(db.Integer, nullable=False)
+    login = db.Column(db.Integer, nullable=False, index=True)
     server = db.Column(db.String(100), nullable=False)
     balance = db.Column(db.Float, default=0.0)
     equity = db.Column(db.Float, default=0.0)
@@ -33,9 +63,18 @@ class Account(db.Model):
         }
 
 class Trade(db.Model):
+    __table_args__ = (
+        db.Index('ix_trade_account_status_profit', 'account_id', 'status', 'profit'),
+        db.Index('ix_trade_account_status_closetime', 'account_id', 'status', 'close_time'),
+        # Analytics filter by status and a time window, and the trades page by symbol
+        db.Index('ix_trade_status_opentime', 'status', 'open_time'),
+        db.Index('ix_trade_status_closetime_profit', 'status', 'close_time', 'profit'),
+        db.Index('ix_trade_symbol_opentime', 'symbol', 'open_time'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
-    ticket = db.Column(db.BigInteger, nullable=False)
+    ticket = db.Column(db.BigInteger, nullable=False, index=True)
     symbol = db.Column(db.String(20), nullable=False)
     trade_type = db.Column(db.String(10), nullable=False)  # BUY/SELL
     volume = db.Column(db.Float, nullable=False)
@@ -72,6 +111,64 @@ class Trade(db.Model):
             'close_time': self.close_time.isoformat() if self.close_time else None,
             'comment': self.comment
         }
+    
+    @classmethod
+    def page_dicts(cls, criteria, page, per_page):
+        """A lazily fetched page of to_dict()-shaped trades, newest first, plus total and page count"""
+        def convert(item):
+            for field in ('open_time', 'close_time'):
+                if item[field]:
+                    item[field] = item[field].isoformat()
+            return item
+        
+        return _dict_page(
+            [cls.id, cls.ticket, cls.symbol, cls.trade_type, cls.volume, cls.price_open,
+             cls.price_close, cls.sl, cls.tp, cls.profit, cls.commission, cls.swap,
+             cls.status, cls.strategy, cls.open_time, cls.close_time, cls.comment],
+            criteria, cls.open_time.desc(), page, per_page, convert
+        )
+    
+    @classmethod
+    def stats(cls, *criteria, subset=None, period=None):
+        """Count and sum trades matching criteria in a single aggregate query
+        
+        With ``subset``, total_trades still counts every matching trade but
+        the other figures only cover the trades that also match ``subset``.
+        With ``period``, every figure except open_trades is limited to the
+        trades matching ``period``; open_trades counts all open trades.
+        """
+        # Ids and profits are NULL outside the period/subset, so those rows
+        # drop out of the counts and sums
+        trade_id, profit = cls.id, cls.profit
+        if period is not None:
+            trade_id = case((period, cls.id))
+            profit = case((period, cls.profit))
+        if subset is not None:
+            profit = case((subset, profit))
+        row = db.session.query(
+            func.count(trade_id).label('total'),
+            func.sum(case((cls.status == 'OPEN', 1), else_=0)).label('open'),
+            func.sum(case((profit > 0, 1), else_=0)).label('wins'),
+            func.sum(case((profit < 0, 1), else_=0)).label('losses'),
+            func.sum(case((profit > 0, profit), else_=0)).label('gross_profit'),
+            func.sum(case((profit < 0, -profit), else_=0)).label('gross_loss'),
+            func.max(profit).label('best'),
+            func.min(profit).label('worst'),
+        ).filter(*criteria).one()
+        
+        gross_profit = float(row.gross_profit or 0)
+        gross_loss = float(row.gross_loss or 0)
+        return {
+            'total_trades': row.total,
+            'open_trades': int(row.open or 0),
+            'winning_trades': int(row.wins or 0),
+            'losing_trades': int(row.losses or 0),
+            'gross_profit': gross_profit,
+            'gross_loss': gross_loss,
+            'total_profit': gross_profit - gross_loss,
+            'best_profit': row.best,
+            'worst_profit': row.worst
+        }
 
 class BacktestResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -108,8 +205,20 @@ class BacktestResult(db.Model):
             'profit_factor': self.profit_factor,
             'return_pct': ((self.final_balance - self.initial_balance) / self.initial_balance * 100) if self.initial_balance > 0 else 0
         }
+    
+    @classmethod
+    def bulk_insert(cls, rows):
+        """Insert result rows (dicts of column values) with one Core INSERT and commit"""
+        if not rows:
+            return
+        db.session.execute(insert(cls), rows)
+        db.session.commit()
 
 class SystemLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_systemlog_level_timestamp', 'level', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     level = db.Column(db.String(20), nullable=False)
     message = db.Column(db.Text, nullable=False)
@@ -124,3 +233,26 @@ class SystemLog(db.Model):
             'module': self.module,
             'timestamp': self.timestamp.isoformat()
         }
+    
+    @classmethod
+    def page_dicts(cls, criteria, page, per_page):
+        """A lazily fetched page of to_dict()-shaped logs, newest first, plus total and page count"""
+        def convert(item):
+            item['timestamp'] = item['timestamp'].isoformat()
+            return item
+        
+        return _dict_page(
+            [cls.id, cls.level, cls.message, cls.module, cls.timestamp],
+            criteria, cls.timestamp.desc(), page, per_page, convert
+        )
+
+def create_missing_indexes():
+    """Build model indexes that an existing database doesn't have yet.
+    
+    db.create_all() skips tables that already exist, so indexes added to a
+    model later would otherwise only appear in fresh databases.
+    """
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
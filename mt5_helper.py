@@ -1,13 +1,70 @@
 import MetaTrader5 as mt5
-import pandas as pd
 import logging
-from app import db, socketio
+import atexit
+import queue
+import threading
+import time
+from collections import deque
+import numpy as np
+from sqlalchemy import update
+from app import app, db, socketio
 from models import Trade, Account
-from datetime import datetime
+from datetime import datetime, timedelta
 from notifications import NotificationManager
+import response_cache
+import bot_state
+
+try:
+    from eventlet import patcher as eventlet_patcher, tpool
+    EVENTLET_AVAILABLE = True
+except ImportError:
+    EVENTLET_AVAILABLE = False
+
+try:
+    import gevent
+    from gevent import monkey as gevent_monkey
+    GEVENT_AVAILABLE = True
+except ImportError:
+    GEVENT_AVAILABLE = False
 
 notification_manager = NotificationManager()
 
+def _offload(fn, *args, **kwargs):
+    """Run a blocking MT5 call, on a native thread when eventlet or gevent has patched threading
+    
+    Under either hub the trading threads are green, so a terminal round-trip
+    would otherwise stall every WebSocket client until it returns.
+    """
+    if EVENTLET_AVAILABLE and eventlet_patcher.is_monkey_patched('thread'):
+        return tpool.execute(fn, *args, **kwargs)
+    if GEVENT_AVAILABLE and gevent_monkey.is_module_patched('threading'):
+        return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+# Trade events waiting to be emitted and notified. The order path only
+# queues them; a background task does the socket fan-out and the
+# email/SMS sends so orders never wait on the network.
+_trade_events = queue.Queue()
+_trade_event_task = None
+_trade_event_lock = threading.Lock()
+
+def _dispatch_trade_events():
+    while True:
+        event, payload, notify, trade_info = _trade_events.get()
+        try:
+            socketio.emit(event, payload)
+            notify(trade_info)
+        except Exception as e:
+            logging.error(f"Error dispatching {event} event: {e}")
+
+def _queue_trade_event(event, payload, notify, trade_info):
+    """Emit ``event`` and call ``notify(trade_info)`` in the background"""
+    global _trade_event_task
+    with _trade_event_lock:
+        if _trade_event_task is None:
+            _trade_event_task = socketio.start_background_task(_dispatch_trade_events)
+    _trade_events.put_nowait((event, payload, notify, trade_info))
+
 def initialize_mt5(login, password, server):
     """Initialize MT5 connection with enhanced error handling"""
     max_retries = 3
@@ -29,7 +86,6 @@ def initialize_mt5(login, password, server):
             logging.warning(f"MT5 connection attempt {retry_count} failed: {e}")
             
             if retry_count < max_retries:
-                import time
                 time.sleep(5)  # Wait before retry
             else:
                 raise e
@@ -39,31 +95,165 @@ def shutdown_mt5():
     mt5.shutdown()
     logging.info("MT5 connection shutdown.")
 
+class ConnectionPool:
+    """Keep the MT5 terminal connection alive across trading cycles.
+
+    The MT5 API drives a single terminal per process, so the pool tracks the
+    logged-in account and only logs in again when a different account asks
+    for the connection. ``terminal_info()`` is used as a cheap health check
+    before reuse, and a full re-initialize only happens when it fails.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active_login = None
+        self._active_server = None
+
+    def get(self, login, password, server):
+        """Ensure the terminal is connected and logged in to ``login``"""
+        with self._lock:
+            if self._active_login is not None and mt5.terminal_info() is None:
+                logging.warning("MT5 terminal connection lost, reconnecting...")
+                self._active_login = None
+
+            if self._active_login is None:
+                initialize_mt5(login, password, server)
+            elif self._active_login != login:
+                if not mt5.login(login, password, server):
+                    error = mt5.last_error()
+                    self._active_login = None
+                    shutdown_mt5()
+                    raise RuntimeError(f"MT5 login failed for account {login}: {error}")
+                logging.info(f"Switched MT5 login to account {login} on {server}")
+
+            # Cached bars belong to the broker feed they were fetched from
+            if server != self._active_server:
+                _BAR_CACHE.clear()
+                self._active_server = server
+
+            self._active_login = login
+            return True
+
+    @property
+    def active_login(self):
+        """Login the terminal is currently connected as, or None"""
+        return self._active_login
+
+    def shutdown(self):
+        """Shutdown the pooled connection, if any"""
+        with self._lock:
+            if self._active_login is not None:
+                self._active_login = None
+                shutdown_mt5()
+
+connection_pool = ConnectionPool()
+atexit.register(connection_pool.shutdown)
+
+def _account_login():
+    """Login of the connected account, asking the terminal only if the pool doesn't know it"""
+    login = connection_pool.active_login
+    if login is None:
+        account_info = _offload(mt5.account_info)
+        login = account_info.login if account_info else None
+    return login
+
+# symbol_info() results for the current session; point, contract size and
+# volume limits do not change while a session runs
+_symbol_info_cache = {}
+_symbol_info_lock = threading.Lock()
+
+def get_symbol_info(symbol):
+    """Get symbol info, memoized until clear_symbol_info_cache() is called"""
+    info = _symbol_info_cache.get(symbol)
+    if info is None:
+        info = _offload(mt5.symbol_info, symbol)
+        if info is not None:
+            with _symbol_info_lock:
+                _symbol_info_cache[symbol] = info
+    return info
+
+def clear_symbol_info_cache():
+    """Forget memoized symbol info, e.g. at the start of a new session"""
+    with _symbol_info_lock:
+        _symbol_info_cache.clear()
+
+# Last bars returned per (symbol, timeframe); later calls only fetch a short
+# tail and splice it on, since everything before it is unchanged history
+_BAR_CACHE = {}
+
+# Bars re-fetched on a cache hit: the forming bar, any bars that closed since
+# the previous call, and an overlap to line the tail up with the cache
+_INCREMENTAL_BARS = 8
+
+def _splice_bars(cached, tail, bars):
+    """Append ``tail`` to ``cached``, or None if they don't overlap"""
+    first_time = tail['time'][0]
+    keep = np.searchsorted(cached['time'], first_time)
+    if keep == len(cached) or cached['time'][keep] != first_time:
+        return None
+    return np.concatenate((cached[:keep], tail))[-bars:]
+
 def get_data(symbol, timeframe, bars=200):
-    """Get market data with error handling"""
+    """Get market data as the NumPy structured array returned by MT5.
+
+    Fields are indexed by name (``rates['close']``). After the first call
+    for a symbol and timeframe only the most recent bars are requested
+    from the terminal.
+    """
     try:
-        if not mt5.symbol_select(symbol, True):
+        if not _offload(mt5.symbol_select, symbol, True):
             logging.warning(f"Could not select symbol {symbol}")
             return None
-            
-        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, bars)
+        
+        key = (symbol, timeframe)
+        cached = _BAR_CACHE.get(key)
+        rates = None
+        if cached is not None and len(cached) >= bars:
+            tail = _offload(mt5.copy_rates_from_pos, symbol, timeframe, 0, _INCREMENTAL_BARS)
+            if tail is not None and len(tail) > 0:
+                rates = _splice_bars(cached, tail, bars)
+        
+        # First call, or too many bars passed since the last one
+        if rates is None:
+            rates = _offload(mt5.copy_rates_from_pos, symbol, timeframe, 0, bars)
         
         if rates is None or len(rates) == 0:
             logging.warning(f"No data for {symbol} on timeframe {timeframe}")
+            _BAR_CACHE.pop(key, None)
             return None
-            
-        df = pd.DataFrame(rates)
-        df['time'] = pd.to_datetime(df['time'], unit='s')
-        return df
+        
+        _BAR_CACHE[key] = rates
+        return rates
         
     except Exception as e:
         logging.error(f"Error getting data for {symbol}: {e}")
         return None
 
+# Recent ticks per symbol, so callers asking for the same symbol within
+# _TICK_TTL seconds share one terminal round-trip
+_TICK_TTL = 0.2
+_tick_cache = {}
+
+def get_tick(symbol):
+    """Latest tick for ``symbol``, at most _TICK_TTL seconds old
+    
+    Orders fetch their own fresh tick; this is for position management and
+    other reads that can share a quote.
+    """
+    now = time.monotonic()
+    cached = _tick_cache.get(symbol)
+    if cached is not None and now - cached[0] < _TICK_TTL:
+        return cached[1]
+    
+    tick = _offload(mt5.symbol_info_tick, symbol)
+    if tick is not None:
+        _tick_cache[symbol] = (now, tick)
+    return tick
+
 def place_order(symbol, order_type, volume, sl=None, tp=None, deviation=20, magic=123456, comment="auto_bot"):
     """Place order with database logging and notifications"""
     try:
-        tick = mt5.symbol_info_tick(symbol)
+        tick = _offload(mt5.symbol_info_tick, symbol)
         if tick is None:
             logging.error(f"Could not get tick for {symbol}")
             return None
@@ -86,7 +276,7 @@ def place_order(symbol, order_type, volume, sl=None, tp=None, deviation=20, magi
             "type_filling": mt5.ORDER_FILLING_IOC,
         }
         
-        result = mt5.order_send(request)
+        result = _offload(mt5.order_send, request)
         
         if result.retcode != mt5.TRADE_RETCODE_DONE:
             logging.error(f"Order send failed for {symbol}: {result.comment}")
@@ -94,10 +284,12 @@ def place_order(symbol, order_type, volume, sl=None, tp=None, deviation=20, magi
         
         logging.info(f"Order sent successfully for {symbol}: Ticket #{result.order}")
         
+        account_login = _account_login()
+        
         # Save trade to database
-        save_trade_to_db(result, symbol, order_type, volume, price, sl, tp, comment)
+        save_trade_to_db(result, symbol, order_type, volume, price, sl, tp, comment, account_login)
         
-        # Send notification
+        # Send notification and real-time update
         trade_info = {
             'symbol': symbol,
             'type': order_type.upper(),
@@ -106,19 +298,16 @@ def place_order(symbol, order_type, volume, sl=None, tp=None, deviation=20, magi
             'sl': sl,
             'tp': tp,
             'strategy': comment,
-            'account': mt5.account_info().login if mt5.account_info() else 'Unknown'
+            'account': account_login or 'Unknown'
         }
-        notification_manager.send_trade_notification(trade_info)
-        
-        # Emit real-time update
-        socketio.emit('new_trade', {
+        _queue_trade_event('new_trade', {
             'ticket': result.order,
             'symbol': symbol,
             'type': order_type.upper(),
             'volume': volume,
             'price': price,
             'timestamp': datetime.utcnow().isoformat()
-        })
+        }, notification_manager.send_trade_notification, trade_info)
         
         return result
         
@@ -126,19 +315,107 @@ def place_order(symbol, order_type, volume, sl=None, tp=None, deviation=20, magi
         logging.error(f"Exception in place_order for {symbol}: {e}", exc_info=True)
         return None
 
-def save_trade_to_db(result, symbol, order_type, volume, price, sl, tp, comment):
-    """Save trade to database"""
+# Account ids by MT5 login; only found ids are cached so accounts synced
+# later are still picked up
+_account_ids = {}
+
+# Balance fields last written per account id, so unchanged values skip the write
+_account_values = {}
+
+# New trades are written in batches: on a short timer, or straight away once
+# _TRADE_FLUSH_SIZE are waiting
+_TRADE_FLUSH_SIZE = 100
+_TRADE_FLUSH_DELAY = 0.25
+_trade_write_buffer = deque()
+_trade_buffer_lock = threading.Lock()
+_trade_flush_timer = None
+
+def get_account_id(login):
+    """Database id of the account with this MT5 login, cached once found"""
+    account_id = _account_ids.get(login)
+    if account_id is None:
+        account_id = db.session.query(Account.id).filter_by(login=login).scalar()
+        if account_id is not None:
+            _account_ids[login] = account_id
+    return account_id
+
+def save_account_info(login, account_info):
+    """Store balance, equity and margin for ``login``, writing only when they changed"""
+    account_id = get_account_id(login)
+    if account_id is None:
+        return
+    
+    values = {
+        'balance': account_info.balance,
+        'equity': account_info.equity,
+        'margin': account_info.margin,
+        'margin_free': account_info.margin_free,
+        'currency': account_info.currency
+    }
+    if _account_values.get(account_id) == values:
+        return
+    
     try:
-        account_info = mt5.account_info()
-        if not account_info:
+        db.session.execute(
+            update(Account).where(Account.id == account_id).values(updated_at=datetime.utcnow(), **values)
+        )
+        db.session.commit()
+        _account_values[account_id] = values
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error saving account info for {login}: {e}")
+
+def flush_trade_buffer():
+    """Write buffered trades to the database in one transaction"""
+    global _trade_flush_timer
+    with _trade_buffer_lock:
+        if _trade_flush_timer is not None:
+            _trade_flush_timer.cancel()
+            _trade_flush_timer = None
+        trades = list(_trade_write_buffer)
+        _trade_write_buffer.clear()
+    
+    if not trades:
+        return
+    
+    with app.app_context():
+        try:
+            db.session.bulk_save_objects(trades)
+            db.session.commit()
+            bot_state.invalidate_trade_counts()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error saving {len(trades)} trades to database: {e}")
+
+atexit.register(flush_trade_buffer)
+
+def _buffer_trade(trade):
+    global _trade_flush_timer
+    with _trade_buffer_lock:
+        _trade_write_buffer.append(trade)
+        flush_now = len(_trade_write_buffer) >= _TRADE_FLUSH_SIZE
+        if not flush_now and _trade_flush_timer is None:
+            _trade_flush_timer = threading.Timer(_TRADE_FLUSH_DELAY, flush_trade_buffer)
+            _trade_flush_timer.daemon = True
+            _trade_flush_timer.start()
+    
+    if flush_now:
+        flush_trade_buffer()
+
+def save_trade_to_db(result, symbol, order_type, volume, price, sl, tp, comment, account_login=None):
+    """Queue a trade for the next batched database write"""
+    try:
+        if account_login is None:
+            account_login = _account_login()
+        if account_login is None:
             return
         
-        account = Account.query.filter_by(login=account_info.login).first()
-        if not account:
+        account_id = get_account_id(account_login)
+        if account_id is None:
             return
         
         trade = Trade(
-            account_id=account.id,
+            account_id=account_id,
             ticket=result.order,
             symbol=symbol,
             trade_type=order_type.upper(),
@@ -148,11 +425,11 @@ def save_trade_to_db(result, symbol, order_type, volume, price, sl, tp, comment)
             tp=tp if tp else 0,
             status='OPEN',
             strategy=comment,
+            open_time=datetime.utcnow(),
             comment=f"Opened by auto bot - {comment}"
         )
         
-        db.session.add(trade)
-        db.session.commit()
+        _buffer_trade(trade)
         
     except Exception as e:
         logging.error(f"Error saving trade to database: {e}")
@@ -160,7 +437,7 @@ def save_trade_to_db(result, symbol, order_type, volume, price, sl, tp, comment)
 def get_open_positions(symbol=None):
     """Get open positions with enhanced error handling"""
     try:
-        positions = mt5.positions_get(symbol=symbol) if symbol else mt5.positions_get()
+        positions = _offload(mt5.positions_get, symbol=symbol) if symbol else _offload(mt5.positions_get)
         return positions if positions else []
     except Exception as e:
         logging.error(f"Error getting open positions: {e}")
@@ -172,7 +449,7 @@ def close_position(position, comment="auto_close"):
         symbol = position.symbol
         is_buy = position.type == mt5.POSITION_TYPE_BUY
         order_type = mt5.ORDER_TYPE_SELL if is_buy else mt5.ORDER_TYPE_BUY
-        tick = mt5.symbol_info_tick(symbol)
+        tick = _offload(mt5.symbol_info_tick, symbol)
         
         if not tick:
             logging.error(f"Could not get tick for {symbol}")
@@ -194,7 +471,7 @@ def close_position(position, comment="auto_close"):
             "type_filling": mt5.ORDER_FILLING_IOC,
         }
         
-        result = mt5.order_send(request)
+        result = _offload(mt5.order_send, request)
         
         if result.retcode != mt5.TRADE_RETCODE_DONE:
             logging.error(f"Failed to close position {position.ticket}: {result.comment}")
@@ -205,8 +482,8 @@ def close_position(position, comment="auto_close"):
         # Update trade in database
         update_closed_trade_in_db(position, price)
         
-        # Send notification
-        duration = datetime.utcnow() - datetime.fromtimestamp(position.time)
+        # Send notification and real-time update
+        duration = timedelta(seconds=int(time.time()) - int(position.time))
         trade_info = {
             'symbol': symbol,
             'type': 'BUY' if is_buy else 'SELL',
@@ -215,18 +492,15 @@ def close_position(position, comment="auto_close"):
             'price_close': price,
             'profit': position.profit,
             'duration': str(duration),
-            'account': mt5.account_info().login if mt5.account_info() else 'Unknown'
+            'account': _account_login() or 'Unknown'
         }
-        notification_manager.send_trade_closed_notification(trade_info)
-        
-        # Emit real-time update
-        socketio.emit('trade_closed', {
+        _queue_trade_event('trade_closed', {
             'ticket': position.ticket,
             'symbol': symbol,
             'profit': position.profit,
             'close_price': price,
             'timestamp': datetime.utcnow().isoformat()
-        })
+        }, notification_manager.send_trade_closed_notification, trade_info)
         
         return result
         
@@ -237,6 +511,8 @@ def close_position(position, comment="auto_close"):
 def update_closed_trade_in_db(position, close_price):
     """Update closed trade in database"""
     try:
+        # The trade may still be waiting in the write buffer
+        flush_trade_buffer()
         trade = Trade.query.filter_by(ticket=position.ticket).first()
         if trade:
             trade.price_close = close_price
@@ -244,6 +520,8 @@ def update_closed_trade_in_db(position, close_price):
             trade.status = 'CLOSED'
             trade.close_time = datetime.utcnow()
             db.session.commit()
+            response_cache.invalidate('analytics:')
+            bot_state.invalidate_trade_counts()
             
     except Exception as e:
         logging.error(f"Error updating closed trade in database: {e}")
@@ -1,71 +1,355 @@
+import atexit
 import smtplib
 import requests
 import logging
 import os
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
 
 try:
-    from email.mime.text import MimeText
-    from email.mime.multipart import MimeMultipart
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
     EMAIL_IMPORTS_AVAILABLE = True
 except ImportError:
     EMAIL_IMPORTS_AVAILABLE = False
 
+try:
+    from twilio.rest import Client as TwilioClient
+    from twilio.base.exceptions import TwilioRestException
+    from twilio.http.http_client import TwilioHttpClient
+    TWILIO_AVAILABLE = True
+except ImportError:
+    TWILIO_AVAILABLE = False
+
+SmtpConfig = namedtuple('SmtpConfig', 'server port user password to_email')
+TwilioConfig = namedtuple('TwilioConfig', 'sid token from_phone to_phone')
+
+def _smtp_port():
+    port = os.getenv('SMTP_PORT')
+    if not port:
+        return None
+    try:
+        return int(port)
+    except ValueError:
+        logging.error(f"Invalid SMTP_PORT: {port}")
+        return None
+
+# Retries for transient send failures: exponential backoff with full jitter,
+# or the server's Retry-After when it gives one
+_RETRY_BASE = 0.5
+_RETRY_CAP = 30
+_MAX_ATTEMPTS = 5
+_TRANSIENT_SMTP_CODES = {421, 450, 451}
+_TWILIO_RATE_LIMIT_CODES = {20429, 54009}
+
+def _backoff_delay(attempt):
+    return random.uniform(0, min(_RETRY_CAP, _RETRY_BASE * 2 ** attempt))
+
+def _smtp_retry_delay(error, attempt):
+    if isinstance(error, smtplib.SMTPResponseException) and error.smtp_code in _TRANSIENT_SMTP_CODES:
+        return _backoff_delay(attempt)
+    return None
+
+def _twilio_retry_delay(error, attempt, headers=None):
+    """Delay before retrying a Twilio error, or None if it isn't transient
+    
+    TwilioRestException doesn't carry the response, so the headers of the
+    failed response are passed in separately (see _HeaderRecordingHttpClient).
+    """
+    if not isinstance(error, TwilioRestException):
+        return None
+    if error.status == 429 or error.code in _TWILIO_RATE_LIMIT_CODES:
+        retry_after = (headers or {}).get('Retry-After')
+        try:
+            return min(_RETRY_CAP, float(retry_after))
+        except (TypeError, ValueError):
+            return _backoff_delay(attempt)
+    if error.status >= 500:
+        return _backoff_delay(attempt)
+    return None
+
+if TWILIO_AVAILABLE:
+    class _HeaderRecordingHttpClient(TwilioHttpClient):
+        """Twilio HTTP client that keeps the headers of the last response"""
+        
+        last_headers = None
+        
+        def request(self, *args, **kwargs):
+            self.last_headers = None
+            response = super().request(*args, **kwargs)
+            self.last_headers = response.headers
+            return response
+
+class TokenBucket:
+    """Blocking token bucket whose refill rate adapts to the provider (AIMD)
+    
+    Each success raises the rate by ``step`` up to ``max_rate``; each
+    throttled or transient failure halves it, down to ``min_rate``, and
+    empties the bucket so the next send waits.
+    """
+    
+    def __init__(self, rate, capacity, min_rate=None, max_rate=None, step=0.05):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate or rate / 8
+        self.max_rate = max_rate or rate
+        self.step = step
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def acquire(self):
+        """Take one token, sleeping until one is available"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+    
+    def increase_rate(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.step)
+    
+    def decrease_rate(self):
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            self._tokens = 0
+
+# Twilio queues about one SMS per second per number; SMTP relays allow more
+sms_bucket = TokenBucket(rate=1.0, capacity=5)
+email_bucket = TokenBucket(rate=2.0, capacity=10)
+
+def _with_retries(send, retry_delay, bucket):
+    """Call ``send()`` at the bucket's pace, retrying while ``retry_delay(error, attempt)`` returns a delay"""
+    for attempt in range(_MAX_ATTEMPTS):
+        bucket.acquire()
+        try:
+            result = send()
+        except Exception as e:
+            delay = retry_delay(e, attempt)
+            if delay is None:
+                raise
+            bucket.decrease_rate()
+            if attempt == _MAX_ATTEMPTS - 1:
+                raise
+            logging.warning(f"Notification send failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            bucket.increase_rate()
+            return result
+
+class SmtpConnection:
+    """One logged-in SMTP connection, reused across emails
+    
+    The connection is checked with NOOP before reuse and re-opened if the
+    server dropped it, so each email doesn't pay for its own connect,
+    STARTTLS and login.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._server = None
+        self._cfg = None
+    
+    def _connect(self, cfg):
+        server = smtplib.SMTP(cfg.server, cfg.port, timeout=30)
+        server.starttls()
+        server.login(cfg.user, cfg.password)
+        return server
+    
+    def _is_alive(self):
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+    
+    def send_message(self, cfg, msg):
+        """Send ``msg``, reconnecting once if the pooled connection has gone stale"""
+        with self._lock:
+            if self._server is not None and (cfg != self._cfg or not self._is_alive()):
+                self._close()
+            
+            if self._server is None:
+                self._server = self._connect(cfg)
+                self._cfg = cfg
+            
+            try:
+                self._server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                self._server = self._connect(cfg)
+                self._server.send_message(msg)
+    
+    def _close(self):
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+    
+    def close(self):
+        """Quit the pooled connection, if any"""
+        with self._lock:
+            if self._server is not None:
+                self._close()
+
+# Shared by every NotificationManager; they all send with the same settings
+smtp_connection = SmtpConnection()
+atexit.register(smtp_connection.close)
+
+# Notifications are delivered by one background worker so callers never wait
+# on SMTP or Twilio
+_NOTIFY_QUEUE_SIZE = 1024
+_notify_queue = queue.Queue(maxsize=_NOTIFY_QUEUE_SIZE)
+_notify_worker = None
+_notify_lock = threading.Lock()
+
+def _notification_worker():
+    while True:
+        manager, subject, message = _notify_queue.get()
+        try:
+            manager._deliver(subject, message)
+        except Exception as e:
+            logging.error(f"Failed to deliver notification '{subject}': {e}")
+
+def _flush_pending():
+    """Deliver whatever is still queued; runs at exit, before the SMTP connection closes"""
+    while True:
+        try:
+            manager, subject, message = _notify_queue.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            manager._deliver(subject, message)
+        except Exception as e:
+            logging.error(f"Failed to deliver notification '{subject}': {e}")
+
+atexit.register(_flush_pending)
+
+def _start_worker():
+    global _notify_worker
+    with _notify_lock:
+        if _notify_worker is None:
+            _notify_worker = threading.Thread(target=_notification_worker, name="notifications", daemon=True)
+            _notify_worker.start()
+
+# Message bodies, filled with str.format_map from the trade/summary dicts
+_TRADE_OPEN_TMPL = """
+        New trade has been opened:
+        
+        Symbol: {symbol}
+        Type: {type}
+        Volume: {volume}
+        Entry Price: {price}
+        Stop Loss: {sl}
+        Take Profit: {tp}
+        Strategy: {strategy}
+        Account: {account}
+        """
+
+_TRADE_CLOSE_TMPL = """
+        Trade has been closed:
+        
+        Symbol: {symbol}
+        Type: {type}
+        Volume: {volume}
+        Entry Price: {price_open}
+        Exit Price: {price_close}
+        Profit/Loss: ${profit:.2f}
+        Duration: {duration}
+        Account: {account}
+        """
+
+_DAILY_TMPL = """
+        Daily Trading Summary:
+        
+        Total Trades: {total_trades}
+        Winning Trades: {winning_trades}
+        Losing Trades: {losing_trades}
+        Win Rate: {win_rate:.2f}%
+        Total P&L: ${total_pnl:.2f}
+        Best Trade: ${best_trade:.2f}
+        Worst Trade: ${worst_trade:.2f}
+        
+        Account Balances:
+        """
+
 class NotificationManager:
     def __init__(self):
+        # Settings are read from the environment once; they don't change while running
+        self._smtp_cfg = SmtpConfig(
+            server=os.getenv('SMTP_SERVER'),
+            port=_smtp_port(),
+            user=os.getenv('EMAIL_USER'),
+            password=os.getenv('EMAIL_PASSWORD'),
+            to_email=os.getenv('NOTIFICATION_EMAIL')
+        )
+        self._twilio_cfg = TwilioConfig(
+            sid=os.getenv('TWILIO_SID'),
+            token=os.getenv('TWILIO_TOKEN'),
+            from_phone=os.getenv('TWILIO_PHONE'),
+            to_phone=os.getenv('NOTIFICATION_PHONE')
+        )
         self.email_enabled = self._check_email_config()
         self.sms_enabled = self._check_sms_config()
+        
+        # The Twilio client is thread-safe and keeps its HTTP session between sends
+        self._twilio_client = None
+        if self.sms_enabled and TWILIO_AVAILABLE:
+            self._twilio_client = TwilioClient(self._twilio_cfg.sid, self._twilio_cfg.token,
+                                               http_client=_HeaderRecordingHttpClient())
+    
+    @property
+    def enabled(self):
+        """Whether any notification channel is configured"""
+        return self.email_enabled or self.sms_enabled
     
     def _check_email_config(self):
         """Check if email configuration is available"""
         if not EMAIL_IMPORTS_AVAILABLE:
             return False
-        required_vars = ['SMTP_SERVER', 'SMTP_PORT', 'EMAIL_USER', 'EMAIL_PASSWORD', 'NOTIFICATION_EMAIL']
-        return all(os.getenv(var) for var in required_vars)
+        return all(self._smtp_cfg)
     
     def _check_sms_config(self):
         """Check if SMS configuration is available"""
-        return bool(os.getenv('TWILIO_SID') and os.getenv('TWILIO_TOKEN') and os.getenv('NOTIFICATION_PHONE'))
+        cfg = self._twilio_cfg
+        return bool(cfg.sid and cfg.token and cfg.to_phone)
     
     def send_trade_notification(self, trade_info):
         """Send notification for new trades"""
+        if not self.enabled:
+            return
         subject = f"New Trade Opened: {trade_info['symbol']}"
-        message = f"""
-        New trade has been opened:
-        
-        Symbol: {trade_info['symbol']}
-        Type: {trade_info['type']}
-        Volume: {trade_info['volume']}
-        Entry Price: {trade_info['price']}
-        Stop Loss: {trade_info['sl']}
-        Take Profit: {trade_info['tp']}
-        Strategy: {trade_info['strategy']}
-        Account: {trade_info['account']}
-        """
+        message = _TRADE_OPEN_TMPL.format_map(trade_info)
         
         self._send_notifications(subject, message)
     
     def send_trade_closed_notification(self, trade_info):
         """Send notification when trades are closed"""
+        if not self.enabled:
+            return
         profit_loss = "Profit" if trade_info['profit'] > 0 else "Loss"
         subject = f"Trade Closed - {profit_loss}: {trade_info['symbol']}"
         
-        message = f"""
-        Trade has been closed:
-        
-        Symbol: {trade_info['symbol']}
-        Type: {trade_info['type']}
-        Volume: {trade_info['volume']}
-        Entry Price: {trade_info['price_open']}
-        Exit Price: {trade_info['price_close']}
-        Profit/Loss: ${trade_info['profit']:.2f}
-        Duration: {trade_info['duration']}
-        Account: {trade_info['account']}
-        """
+        message = _TRADE_CLOSE_TMPL.format_map(trade_info)
         
         self._send_notifications(subject, message)
     
     def send_error_notification(self, error_message):
         """Send notification for critical errors"""
+        if not self.enabled:
+            return
         subject = "Forex Bot - Critical Error"
         message = f"A critical error occurred in the trading bot:\n\n{error_message}"
         
@@ -73,27 +357,29 @@ class NotificationManager:
     
     def send_daily_summary(self, summary_data):
         """Send daily trading summary"""
+        if not self.enabled:
+            return
         subject = "Forex Bot - Daily Trading Summary"
-        message = f"""
-        Daily Trading Summary:
+        message = _DAILY_TMPL.format_map(summary_data)
         
-        Total Trades: {summary_data['total_trades']}
-        Winning Trades: {summary_data['winning_trades']}
-        Losing Trades: {summary_data['losing_trades']}
-        Win Rate: {summary_data['win_rate']:.2f}%
-        Total P&L: ${summary_data['total_pnl']:.2f}
-        Best Trade: ${summary_data['best_trade']:.2f}
-        Worst Trade: ${summary_data['worst_trade']:.2f}
-        
-        Account Balances:
-        """
-        
-        for account in summary_data['accounts']:
-            message += f"- {account['name']}: ${account['balance']:.2f}\n"
+        # SMS only carries the start of the message, which ends before the balances
+        if self.email_enabled:
+            message += "".join(f"- {account['name']}: ${account['balance']:.2f}\n"
+                               for account in summary_data['accounts'])
         
         self._send_notifications(subject, message)
     
     def _send_notifications(self, subject, message):
+        """Queue email and SMS notifications for the background worker"""
+        if not self.enabled:
+            return
+        _start_worker()
+        try:
+            _notify_queue.put_nowait((self, subject, message))
+        except queue.Full:
+            logging.warning(f"Notification queue full, dropping: {subject}")
+    
+    def _deliver(self, subject, message):
         """Send both email and SMS notifications"""
         if self.email_enabled:
             self._send_email(subject, message)
@@ -108,24 +394,16 @@ class NotificationManager:
             return
             
         try:
-            smtp_server = os.getenv('SMTP_SERVER')
-            smtp_port = int(os.getenv('SMTP_PORT', 587))
-            email_user = os.getenv('EMAIL_USER')
-            email_password = os.getenv('EMAIL_PASSWORD')
-            to_email = os.getenv('NOTIFICATION_EMAIL')
+            cfg = self._smtp_cfg
             
-            msg = MimeMultipart()
-            msg['From'] = email_user
-            msg['To'] = to_email
+            msg = MIMEMultipart()
+            msg['From'] = cfg.user
+            msg['To'] = cfg.to_email
             msg['Subject'] = subject
             
-            msg.attach(MimeText(message, 'plain'))
+            msg.attach(MIMEText(message, 'plain'))
             
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(email_user, email_password)
-            server.send_message(msg)
-            server.quit()
+            _with_retries(lambda: smtp_connection.send_message(cfg, msg), _smtp_retry_delay, email_bucket)
             
             logging.info(f"Email notification sent: {subject}")
             
@@ -134,25 +412,22 @@ class NotificationManager:
     
     def _send_sms(self, message):
         """Send SMS notification using Twilio"""
+        if not TWILIO_AVAILABLE:
+            logging.warning("Twilio library not installed. SMS notifications disabled.")
+            return
+        
         try:
-            from twilio.rest import Client
-            
-            account_sid = os.getenv('TWILIO_SID')
-            auth_token = os.getenv('TWILIO_TOKEN')
-            from_phone = os.getenv('TWILIO_PHONE')
-            to_phone = os.getenv('NOTIFICATION_PHONE')
+            cfg = self._twilio_cfg
+            client = self._twilio_client
             
-            client = Client(account_sid, auth_token)
-            
-            message = client.messages.create(
+            message = _with_retries(lambda: client.messages.create(
                 body=message[:160],  # SMS limit
-                from_=from_phone,
-                to=to_phone
-            )
+                from_=cfg.from_phone,
+                to=cfg.to_phone
+            ), lambda error, attempt: _twilio_retry_delay(error, attempt, client.http_client.last_headers),
+                sms_bucket)
             
             logging.info(f"SMS notification sent: {message.sid}")
             
-        except ImportError:
-            logging.warning("Twilio library not installed. SMS notifications disabled.")
         except Exception as e:
             logging.error(f"Failed to send SMS notification: {e}")
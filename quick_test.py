@@ -24,10 +24,13 @@ def test_endpoints():
     
     all_working = True
     
+    # One keep-alive connection for all the probes
+    session = requests.Session()
+    
     for endpoint in endpoints:
         try:
             url = base_url + endpoint
-            response = requests.get(url, timeout=5)
+            response = session.get(url, timeout=5)
             
             if response.status_code == 200:
                 status = "✓ OK"
@@ -49,6 +52,8 @@ def test_endpoints():
             print(f"{endpoint:<15} ✗ Error: {e}")
             all_working = False
     
+    session.close()
+    
     print("=" * 50)
     if all_working:
         print("✓ All endpoints responding correctly!")
@@ -0,0 +1,85 @@
+"""
+Short-lived cache for JSON API responses.
+
+Bodies are stored already encoded. With REDIS_URL set (and redis installed)
+they live in Redis so every server worker shares them; otherwise each
+process keeps its own copy in memory.
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import Response
+
+from json_utils import dumps
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+_redis = None
+if REDIS_AVAILABLE and os.environ.get('REDIS_URL'):
+    _redis = redis.Redis.from_url(os.environ['REDIS_URL'])
+
+# key -> (expiry on the monotonic clock, body); expired entries are pruned on
+# write and the oldest are dropped beyond _LOCAL_MAX_ENTRIES
+_local = {}
+_LOCAL_MAX_ENTRIES = 256
+_lock = threading.Lock()
+
+def _get(key):
+    if _redis is not None:
+        try:
+            return _redis.get(key)
+        except redis.RedisError as e:
+            logging.warning(f"Redis read failed for {key}: {e}")
+            return None
+    
+    with _lock:
+        entry = _local.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+def _set(key, body, ttl):
+    if _redis is not None:
+        try:
+            _redis.setex(key, ttl, body)
+        except redis.RedisError as e:
+            logging.warning(f"Redis write failed for {key}: {e}")
+        return
+    
+    now = time.monotonic()
+    with _lock:
+        for stale in [k for k, (expiry, _) in _local.items() if expiry <= now]:
+            del _local[stale]
+        _local.pop(key, None)
+        while len(_local) >= _LOCAL_MAX_ENTRIES:
+            del _local[next(iter(_local))]
+        _local[key] = (now + ttl, body)
+
+def cached_json(key, ttl, build):
+    """JSON response for ``key``, calling ``build()`` only when nothing fresher than ``ttl`` seconds is cached"""
+    body = _get(key)
+    if body is None:
+        body = dumps(build())
+        _set(key, body, ttl)
+    return Response(body, mimetype='application/json')
+
+def invalidate(prefix):
+    """Drop cached responses whose key starts with ``prefix``"""
+    if _redis is not None:
+        try:
+            keys = list(_redis.scan_iter(match=f"{prefix}*"))
+            if keys:
+                _redis.delete(*keys)
+        except redis.RedisError as e:
+            logging.warning(f"Redis invalidation failed for {prefix}: {e}")
+        return
+    
+    with _lock:
+        for key in [k for k in _local if k.startswith(prefix)]:
+            del _local[key]
@@ -1,11 +1,87 @@
 import MetaTrader5 as mt5
-import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import logging
+import time
+from functools import lru_cache
+from sqlalchemy import bindparam, update
 from app import db
 from models import Trade
+import mt5_helper
+
+# (profit_currency, account_currency) -> (symbol, inverted) that quoted it last
+# time; the broker's symbol naming doesn't change, so later calls skip probing
+_CONV_CACHE = {}
+
+# (profit_currency, account_currency) -> (rate, inverted, expiry). Rates are
+# reused for a couple of seconds; pairs with no quote aren't probed again for
+# a while, since that takes up to a dozen symbol lookups.
+_RATE_CACHE = {}
+_RATE_TTL = 2.0
+_MISSING_RATE_TTL = 30.0
+
+# Common broker suffixes to try, and the one that last matched a pair; a
+# broker uses the same suffix for all its symbols
+_SYMBOL_SUFFIXES = ['', 'm', '.pro', '_i', '.raw', '.m']
+_resolved_suffix = None
+
+def _select_existing_symbol(symbol):
+    """Add ``symbol`` to MarketWatch only if the broker lists it
+    
+    symbol_info() has no side effects and returns None for unknown names,
+    so non-existent suffix guesses never reach symbol_select().
+    """
+    info = mt5_helper._offload(mt5.symbol_info, symbol)
+    if info is None:
+        return False
+    return info.select or mt5_helper._offload(mt5.symbol_select, symbol, True)
 
 def _get_conversion_rate(profit_currency, account_currency):
+    """Conversion rate and whether it is inverted, reused for _RATE_TTL seconds"""
+    key = (profit_currency, account_currency)
+    now = time.monotonic()
+    cached = _RATE_CACHE.get(key)
+    if cached is not None and now < cached[2]:
+        return cached[0], cached[1]
+    
+    rate, inverted = _find_conversion_rate(profit_currency, account_currency)
+    _RATE_CACHE[key] = (rate, inverted, now + (_RATE_TTL if rate else _MISSING_RATE_TTL))
+    return rate, inverted
+
+def _quote_rate(profit_currency, account_currency):
+    """Quote for one currency pair, direct or inverted, or (None, False)"""
+    global _resolved_suffix
+    key = (profit_currency, account_currency)
+    cached = _CONV_CACHE.get(key)
+    if cached:
+        symbol, inverted = cached
+        tick = mt5_helper.get_tick(symbol)
+        if tick and tick.ask > 0:
+            return tick.ask, inverted
+        # Symbol no longer quoted (e.g. re-listed by the broker); probe again
+        del _CONV_CACHE[key]
+    
+    # The suffix that worked for another pair is tried first
+    suffixes = _SYMBOL_SUFFIXES
+    if _resolved_suffix is not None:
+        suffixes = [_resolved_suffix] + [s for s in _SYMBOL_SUFFIXES if s != _resolved_suffix]
+    
+    for base, quote, inverted in ((profit_currency, account_currency, False),
+                                  (account_currency, profit_currency, True)):
+        for suffix in suffixes:
+            symbol = f"{base}{quote}{suffix}"
+            if _select_existing_symbol(symbol):
+                tick = mt5_helper.get_tick(symbol)
+                if tick and tick.ask > 0:
+                    kind = "inverse" if inverted else "direct"
+                    logging.debug("Found %s conversion rate via %s: %s", kind, symbol, tick.ask)
+                    _CONV_CACHE[key] = (symbol, inverted)
+                    _resolved_suffix = suffix
+                    return tick.ask, inverted
+    
+    return None, False
+
+def _find_conversion_rate(profit_currency, account_currency):
     """
     Enhanced conversion rate calculation with better error handling
     """
@@ -13,32 +89,15 @@ def _get_conversion_rate(profit_currency, account_currency):
         # Handle same currency
         if profit_currency == account_currency:
             return 1.0, False
-            
-        # Common broker suffixes to try
-        suffixes = ['', 'm', '.pro', '_i', '.raw', '.m']
-        
-        # Try direct conversion
-        for suffix in suffixes:
-            symbol = f"{profit_currency}{account_currency}{suffix}"
-            if mt5.symbol_select(symbol, True):
-                tick = mt5.symbol_info_tick(symbol)
-                if tick and tick.ask > 0:
-                    logging.info(f"Found direct conversion rate via {symbol}: {tick.ask}")
-                    return tick.ask, False
         
-        # Try inverse conversion
-        for suffix in suffixes:
-            symbol = f"{account_currency}{profit_currency}{suffix}"
-            if mt5.symbol_select(symbol, True):
-                tick = mt5.symbol_info_tick(symbol)
-                if tick and tick.ask > 0:
-                    logging.info(f"Found inverse conversion rate via {symbol}: {tick.ask}")
-                    return tick.ask, True
+        rate, inverted = _quote_rate(profit_currency, account_currency)
+        if rate:
+            return rate, inverted
         
         # If no direct conversion found, try through USD
         if profit_currency != 'USD' and account_currency != 'USD':
-            usd_rate_1, inverted_1 = _get_conversion_rate(profit_currency, 'USD')
-            usd_rate_2, inverted_2 = _get_conversion_rate('USD', account_currency)
+            usd_rate_1, inverted_1 = _quote_rate(profit_currency, 'USD')
+            usd_rate_2, inverted_2 = _quote_rate('USD', account_currency) if usd_rate_1 else (None, False)
             
             if usd_rate_1 and usd_rate_2:
                 if inverted_1:
@@ -47,7 +106,7 @@ def _get_conversion_rate(profit_currency, account_currency):
                     usd_rate_2 = 1 / usd_rate_2
                 
                 combined_rate = usd_rate_1 * usd_rate_2
-                logging.info(f"Calculated cross rate via USD: {combined_rate}")
+                logging.debug("Calculated cross rate via USD: %s", combined_rate)
                 return combined_rate, False
         
         logging.warning(f"Could not find conversion rate for {profit_currency} -> {account_currency}")
@@ -57,11 +116,18 @@ def _get_conversion_rate(profit_currency, account_currency):
         logging.error(f"Error getting conversion rate: {e}")
         return None, False
 
-def calculate_volume(symbol, sl_pips, risk_percent, max_volume, account_balance=None):
-    """Enhanced volume calculation with better risk management"""
+def calculate_volume(symbol, sl_pips, risk_percent, max_volume, account_balance=None,
+                     symbol_info=None, account_info=None):
+    """Enhanced volume calculation with better risk management
+
+    ``symbol_info`` and ``account_info`` may be passed in by callers that
+    already fetched them to avoid repeating the MT5 round-trips.
+    """
     try:
-        account_info = mt5.account_info()
-        symbol_info = mt5.symbol_info(symbol)
+        if account_info is None:
+            account_info = mt5_helper._offload(mt5.account_info)
+        if symbol_info is None:
+            symbol_info = mt5_helper.get_symbol_info(symbol)
         
         if account_info is None or symbol_info is None:
             logging.error(f"[{symbol}] Could not get account/symbol info for volume calculation.")
@@ -118,7 +184,7 @@ def calculate_volume(symbol, sl_pips, risk_percent, max_volume, account_balance=
         if symbol_info.volume_step > 0:
             volume = round(volume / symbol_info.volume_step) * symbol_info.volume_step
         
-        logging.info(f"[{symbol}] Volume calculation: Risk=${risk_amount:.2f}, SL={sl_pips} pips, Volume={volume:.3f}")
+        logging.info("[%s] Volume calculation: Risk=$%.2f, SL=%s pips, Volume=%.3f", symbol, risk_amount, sl_pips, volume)
         
         return round(volume, 3)
         
@@ -126,25 +192,32 @@ def calculate_volume(symbol, sl_pips, risk_percent, max_volume, account_balance=
         logging.error(f"[{symbol}] Exception in volume calculation: {e}", exc_info=True)
         return 0.01
 
-def get_dynamic_sltp(df, symbol, atr_period=14, sl_multiplier=1.5, tp_multiplier=2.0):
+def get_dynamic_sltp(rates, symbol, atr_period=14, sl_multiplier=1.5, tp_multiplier=2.0, symbol_info=None):
     """Enhanced dynamic SL/TP calculation with multiple methods"""
     try:
-        if df is None or len(df) < atr_period + 5:
+        if rates is None or len(rates) < atr_period + 5:
             logging.warning(f"[{symbol}] Not enough data for dynamic SL/TP calculation")
             return get_fallback_sltp(symbol)
         
+        # Fetched once and shared by all three methods
+        if symbol_info is None:
+            symbol_info = mt5_helper.get_symbol_info(symbol)
+        high = np.asarray(rates['high'], dtype=np.float64)
+        low = np.asarray(rates['low'], dtype=np.float64)
+        close = np.asarray(rates['close'], dtype=np.float64)
+        
         # Method 1: ATR-based
-        atr_sl, atr_tp = _calculate_atr_sltp(df, symbol, atr_period, sl_multiplier, tp_multiplier)
+        atr_sl, atr_tp = _calculate_atr_sltp(high, low, close, symbol_info, atr_period, sl_multiplier, tp_multiplier)
         
         # Method 2: Support/Resistance based
-        sr_sl, sr_tp = _calculate_support_resistance_sltp(df, symbol)
+        sr_sl, sr_tp = _calculate_support_resistance_sltp(high, low, close, symbol_info)
         
         # Method 3: Volatility percentile based
-        vol_sl, vol_tp = _calculate_volatility_percentile_sltp(df, symbol)
+        vol_sl, vol_tp = _calculate_volatility_percentile_sltp(high, low, close, symbol_info)
         
         # Combine methods (use average)
-        sl_pips = np.mean([atr_sl, sr_sl, vol_sl])
-        tp_pips = np.mean([atr_tp, sr_tp, vol_tp])
+        sl_pips = (atr_sl + sr_sl + vol_sl) / 3
+        tp_pips = (atr_tp + sr_tp + vol_tp) / 3
         
         # Apply minimum and maximum constraints
         min_sl, max_sl = get_sl_constraints(symbol)
@@ -153,7 +226,7 @@ def get_dynamic_sltp(df, symbol, atr_period=14, sl_multiplier=1.5, tp_multiplier
         sl_pips = max(min_sl, min(max_sl, sl_pips))
         tp_pips = max(min_tp, min(max_tp, tp_pips))
         
-        logging.info(f"[{symbol}] Dynamic SL/TP: SL={sl_pips:.1f} pips, TP={tp_pips:.1f} pips")
+        logging.debug("[%s] Dynamic SL/TP: SL=%.1f pips, TP=%.1f pips", symbol, sl_pips, tp_pips)
         
         return sl_pips, tp_pips
         
@@ -161,17 +234,16 @@ def get_dynamic_sltp(df, symbol, atr_period=14, sl_multiplier=1.5, tp_multiplier
         logging.error(f"[{symbol}] Error in dynamic SL/TP calculation: {e}")
         return get_fallback_sltp(symbol)
 
-def _calculate_atr_sltp(df, symbol, period, sl_multiplier, tp_multiplier):
+def _calculate_atr_sltp(high, low, close, symbol_info, period, sl_multiplier, tp_multiplier):
     """Calculate SL/TP based on ATR"""
-    high_low = df['high'] - df['low']
-    high_close = (df['high'] - df['close'].shift()).abs()
-    low_close = (df['low'] - df['close'].shift()).abs()
+    # Only the last `period` true ranges are averaged, so only the last
+    # period + 1 bars are read
+    tail = slice(-(period + 1), None)
+    high, low, prev_close = high[tail][1:], low[tail][1:], close[tail][:-1]
     
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    true_range = ranges.max(axis=1)
-    atr = true_range.rolling(period).mean().iloc[-1]
+    true_range = np.maximum(np.maximum(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    atr = true_range[-period:].mean()
     
-    symbol_info = mt5.symbol_info(symbol)
     if not symbol_info or symbol_info.point == 0:
         return 20, 40
     
@@ -184,31 +256,36 @@ def _calculate_atr_sltp(df, symbol, period, sl_multiplier, tp_multiplier):
     
     return sl_pips, tp_pips
 
-def _calculate_support_resistance_sltp(df, symbol):
+def _calculate_support_resistance_sltp(high, low, close, symbol_info):
     """Calculate SL/TP based on nearby support/resistance levels"""
     try:
-        # Find recent highs and lows
-        window = 10
-        df['high_peak'] = df['high'].rolling(window=window, center=True).max() == df['high']
-        df['low_trough'] = df['low'].rolling(window=window, center=True).min() == df['low']
+        current_price = float(close[-1])
         
-        current_price = df['close'].iloc[-1]
+        # Find recent highs and lows (bars that are the extreme of a centered window)
+        window = 10
+        offset = window // 2
+        high_peak = np.zeros(len(high), dtype=bool)
+        low_trough = np.zeros(len(low), dtype=bool)
+        if len(high) >= window:
+            high_max = sliding_window_view(high, window).max(axis=1)
+            low_min = sliding_window_view(low, window).min(axis=1)
+            high_peak[offset:offset + len(high_max)] = high_max == high[offset:offset + len(high_max)]
+            low_trough[offset:offset + len(low_min)] = low_min == low[offset:offset + len(low_min)]
         
         # Find nearest resistance (above current price)
-        resistance_levels = df[df['high_peak'] & (df['high'] > current_price)]['high'].tail(5)
-        if not resistance_levels.empty:
+        resistance_levels = high[high_peak & (high > current_price)][-5:]
+        if len(resistance_levels):
             nearest_resistance = resistance_levels.min()
         else:
             nearest_resistance = current_price * 1.02  # 2% above
         
         # Find nearest support (below current price)
-        support_levels = df[df['low_trough'] & (df['low'] < current_price)]['low'].tail(5)
-        if not support_levels.empty:
+        support_levels = low[low_trough & (low < current_price)][-5:]
+        if len(support_levels):
             nearest_support = support_levels.max()
         else:
             nearest_support = current_price * 0.98  # 2% below
         
-        symbol_info = mt5.symbol_info(symbol)
         if not symbol_info or symbol_info.point == 0:
             return 20, 40
         
@@ -228,19 +305,18 @@ def _calculate_support_resistance_sltp(df, symbol):
         logging.error(f"Error in support/resistance calculation: {e}")
         return 20, 40
 
-def _calculate_volatility_percentile_sltp(df, symbol):
+def _calculate_volatility_percentile_sltp(high, low, close, symbol_info):
     """Calculate SL/TP based on volatility percentiles"""
     try:
         # Calculate daily ranges
-        daily_ranges = (df['high'] - df['low']) / df['close'] * 100  # Percentage ranges
+        daily_ranges = (high - low) / close * 100  # Percentage ranges
         
         # Use percentiles for SL/TP
-        sl_percentile = daily_ranges.quantile(0.3)  # 30th percentile
-        tp_percentile = daily_ranges.quantile(0.7)  # 70th percentile
+        sl_percentile = np.quantile(daily_ranges, 0.3)  # 30th percentile
+        tp_percentile = np.quantile(daily_ranges, 0.7)  # 70th percentile
         
-        current_price = df['close'].iloc[-1]
+        current_price = close[-1]
         
-        symbol_info = mt5.symbol_info(symbol)
         if not symbol_info or symbol_info.point == 0:
             return 20, 40
         
@@ -258,42 +334,77 @@ def _calculate_volatility_percentile_sltp(df, symbol):
         logging.error(f"Error in volatility percentile calculation: {e}")
         return 20, 40
 
+_CRYPTO_CODES = ('BTC', 'ETH', 'ADA', 'SOL', 'XRP')
+
+@lru_cache(maxsize=1024)
+def _symbol_class(symbol):
+    """Classify a symbol as 'gold', 'jpy', 'crypto' or 'major' (checked in that order)"""
+    if 'XAU' in symbol or 'GOLD' in symbol:
+        return 'gold'
+    if 'JPY' in symbol:
+        return 'jpy'
+    if any(crypto in symbol for crypto in _CRYPTO_CODES):
+        return 'crypto'
+    return 'major'
+
+# (min, max) pips per symbol class
+_SL_CONSTRAINTS = {
+    'gold': (50, 2000),
+    'jpy': (5, 500),
+    'crypto': (100, 5000),
+    'major': (10, 1000),
+}
+_TP_CONSTRAINTS = {
+    'gold': (100, 4000),
+    'jpy': (10, 1000),
+    'crypto': (200, 10000),
+    'major': (20, 2000),
+}
+
+# (sl, tp) pips per symbol class
+_FALLBACK_SLTP = {
+    'gold': (200, 400),
+    'jpy': (20, 40),
+    'crypto': (500, 1000),
+    'major': (30, 60),
+}
+
 def get_sl_constraints(symbol):
     """Get SL constraints based on symbol type"""
-    if 'XAU' in symbol or 'GOLD' in symbol:
-        return 50, 2000  # Gold: 50-2000 pips
-    elif 'JPY' in symbol:
-        return 5, 500    # JPY pairs: 5-500 pips
-    elif any(crypto in symbol for crypto in ['BTC', 'ETH', 'ADA', 'SOL', 'XRP']):
-        return 100, 5000  # Crypto: 100-5000 pips
-    else:
-        return 10, 1000   # Major pairs: 10-1000 pips
+    return _SL_CONSTRAINTS[_symbol_class(symbol)]
 
 def get_tp_constraints(symbol):
     """Get TP constraints based on symbol type"""
-    if 'XAU' in symbol or 'GOLD' in symbol:
-        return 100, 4000  # Gold: 100-4000 pips
-    elif 'JPY' in symbol:
-        return 10, 1000   # JPY pairs: 10-1000 pips
-    elif any(crypto in symbol for crypto in ['BTC', 'ETH', 'ADA', 'SOL', 'XRP']):
-        return 200, 10000  # Crypto: 200-10000 pips
-    else:
-        return 20, 2000    # Major pairs: 20-2000 pips
+    return _TP_CONSTRAINTS[_symbol_class(symbol)]
 
 def get_fallback_sltp(symbol):
     """Get fallback SL/TP values when calculation fails"""
-    if 'XAU' in symbol or 'GOLD' in symbol:
-        return 200, 400   # Gold
-    elif 'JPY' in symbol:
-        return 20, 40     # JPY pairs
-    elif any(crypto in symbol for crypto in ['BTC', 'ETH', 'ADA', 'SOL', 'XRP']):
-        return 500, 1000  # Crypto
-    else:
-        return 30, 60     # Major pairs
+    return _FALLBACK_SLTP[_symbol_class(symbol)]
 
 # Enhanced trade management functions
-def _modify_position(position, sl, tp, comment):
-    """Enhanced position modification with better error handling"""
+def save_sltp_updates(updates):
+    """Write queued SL/TP changes to the trade rows in one batched UPDATE"""
+    if not updates:
+        return
+    try:
+        db.session.execute(
+            update(Trade.__table__)
+            .where(Trade.__table__.c.ticket == bindparam('_ticket'))
+            .values(sl=bindparam('_sl'), tp=bindparam('_tp')),
+            updates
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error saving {len(updates)} SL/TP updates: {e}")
+
+def _modify_position(position, sl, tp, comment, pending_updates=None):
+    """Enhanced position modification with better error handling
+    
+    When a ``pending_updates`` list is given the trade row change is queued
+    there for save_sltp_updates(), so a sweep over many positions costs one
+    database round-trip instead of one per position.
+    """
     try:
         request = {
             "action": mt5.TRADE_ACTION_SLTP,
@@ -303,17 +414,16 @@ def _modify_position(position, sl, tp, comment):
             "comment": comment
         }
         
-        result = mt5.order_send(request)
+        result = mt5_helper._offload(mt5.order_send, request)
         
         if result.retcode == mt5.TRADE_RETCODE_DONE:
-            logging.info(f"Successfully modified position {position.ticket}: {comment} SL={sl:.5f}, TP={tp:.5f}")
+            logging.info("Successfully modified position %s: %s SL=%.5f, TP=%.5f", position.ticket, comment, sl, tp)
             
             # Update database
-            trade = Trade.query.filter_by(ticket=position.ticket).first()
-            if trade:
-                trade.sl = sl
-                trade.tp = tp
-                db.session.commit()
+            if pending_updates is not None:
+                pending_updates.append({'_ticket': position.ticket, '_sl': sl, '_tp': tp})
+            else:
+                save_sltp_updates([{'_ticket': position.ticket, '_sl': sl, '_tp': tp}])
                 
             return True
         else:
@@ -324,111 +434,67 @@ def _modify_position(position, sl, tp, comment):
         logging.error(f"Exception in _modify_position: {e}")
         return False
 
-def update_trailing_stop(position, symbol, trail_pips=None, trail_percent=None):
-    """Enhanced trailing stop with percentage and pip-based options"""
-    try:
-        if position.sl == 0:
-            return False  # Don't trail if no initial SL
-        
-        symbol_info = mt5.symbol_info(symbol)
-        tick = mt5.symbol_info_tick(symbol)
-        
-        if not symbol_info or not tick:
-            return False
-        
-        point = symbol_info.point
-        current_price = tick.bid if position.type == mt5.POSITION_TYPE_BUY else tick.ask
-        
-        # Calculate trail distance
-        if trail_percent:
-            trail_distance = current_price * (trail_percent / 100)
-        elif trail_pips:
-            trail_distance = trail_pips * point
-        else:
-            # Default to 1% or 20 pips, whichever is larger
-            percent_distance = current_price * 0.01
-            pip_distance = 20 * point
-            trail_distance = max(percent_distance, pip_distance)
-        
-        new_sl = 0
-        should_modify = False
-        
-        if position.type == mt5.POSITION_TYPE_BUY:
-            new_sl = current_price - trail_distance
-            # Only move SL up and only if trade is profitable
-            if new_sl > position.price_open and new_sl > position.sl:
-                should_modify = True
-        
-        elif position.type == mt5.POSITION_TYPE_SELL:
-            new_sl = current_price + trail_distance
-            # Only move SL down and only if trade is profitable
-            if new_sl < position.price_open and new_sl < position.sl:
-                should_modify = True
-        
-        if should_modify:
-            return _modify_position(position, new_sl, position.tp, "Trailing Stop")
-        
-        return False
-        
-    except Exception as e:
-        logging.error(f"Exception in update_trailing_stop: {e}")
-        return False
-
-def move_sl_to_breakeven(position, symbol, profit_threshold_pips=None, profit_threshold_percent=None):
-    """Enhanced breakeven with flexible profit thresholds"""
+def manage_position(position, symbol_info=None, tick=None, trail_pips=None, breakeven_pips=None,
+                    pending_updates=None):
+    """Apply trailing stop and breakeven rules with at most one SL modification
+    
+    Both candidate stops are computed from one price lookup and the most
+    protective one that improves on the current SL is sent. Applying the two
+    rules separately could send two modifications, the second one undoing a
+    trailing move.
+    """
     try:
-        symbol_info = mt5.symbol_info(symbol)
-        tick = mt5.symbol_info_tick(symbol)
+        symbol = position.symbol
+        if symbol_info is None:
+            symbol_info = mt5_helper.get_symbol_info(symbol)
+        if tick is None:
+            tick = mt5_helper.get_tick(symbol)
         
         if not symbol_info or not tick:
             return False
         
-        # Check if already at breakeven
-        tolerance = 2 * symbol_info.point
-        if abs(position.sl - position.price_open) <= tolerance:
-            return False
-        
         point = symbol_info.point
-        current_price = tick.bid if position.type == mt5.POSITION_TYPE_BUY else tick.ask
-        
-        # Calculate profit threshold
-        if profit_threshold_percent:
-            threshold_distance = position.price_open * (profit_threshold_percent / 100)
-        elif profit_threshold_pips:
-            threshold_distance = profit_threshold_pips * point
-        else:
-            # Default thresholds based on symbol
-            if 'XAU' in symbol:
+        is_buy = position.type == mt5.POSITION_TYPE_BUY
+        sign = 1 if is_buy else -1
+        current_price = tick.bid if is_buy else tick.ask
+        open_price = position.price_open
+        current_sl = position.sl
+        
+        new_sl, comment = current_sl, None
+        
+        # Trailing stop: only trail an existing SL, and only into profit
+        if current_sl != 0:
+            if trail_pips:
+                trail_distance = trail_pips * point
+            else:
+                trail_distance = max(current_price * 0.01, 20 * point)
+            trail_sl = current_price - sign * trail_distance
+            if sign * (trail_sl - open_price) > 0 and sign * (trail_sl - new_sl) > 0:
+                new_sl, comment = trail_sl, "Trailing Stop"
+        
+        # Breakeven once the profit threshold is reached
+        if abs(current_sl - open_price) > 2 * point:
+            if breakeven_pips:
+                threshold_distance = breakeven_pips * point
+            elif 'XAU' in symbol:
                 threshold_distance = 50 * point  # 50 pips for gold
             elif 'JPY' in symbol:
                 threshold_distance = 15 * point  # 15 pips for JPY
             else:
                 threshold_distance = 20 * point  # 20 pips for majors
+            
+            if sign * (current_price - open_price) >= threshold_distance:
+                breakeven_sl = open_price + sign * 2 * point
+                if new_sl == 0 or sign * (breakeven_sl - new_sl) > 0:
+                    new_sl, comment = breakeven_sl, "Breakeven SL"
         
-        # Check if profit threshold is met
-        profit_distance = 0
-        should_move = False
-        
-        if position.type == mt5.POSITION_TYPE_BUY:
-            profit_distance = current_price - position.price_open
-            if profit_distance >= threshold_distance:
-                should_move = True
-        
-        elif position.type == mt5.POSITION_TYPE_SELL:
-            profit_distance = position.price_open - current_price
-            if profit_distance >= threshold_distance:
-                should_move = True
-        
-        if should_move:
-            # Move to breakeven plus small buffer
-            buffer = 2 * point
-            breakeven_sl = position.price_open + (buffer if position.type == mt5.POSITION_TYPE_BUY else -buffer)
-            return _modify_position(position, breakeven_sl, position.tp, "Breakeven SL")
+        if comment is None:
+            return False
         
-        return False
+        return _modify_position(position, new_sl, position.tp, comment, pending_updates)
         
     except Exception as e:
-        logging.error(f"Exception in move_sl_to_breakeven: {e}")
+        logging.error(f"Exception in manage_position: {e}")
         return False
 
 def calculate_position_size_kelly(symbol, win_rate, avg_win, avg_loss, balance):
@@ -453,7 +519,7 @@ def calculate_position_size_kelly(symbol, win_rate, avg_win, avg_loss, balance):
         risk_amount = balance * kelly_fraction
         
         # Assume 1% risk per pip for calculation
-        symbol_info = mt5.symbol_info(symbol)
+        symbol_info = mt5_helper.get_symbol_info(symbol)
         if symbol_info and symbol_info.point > 0:
             volume = risk_amount / (100 * symbol_info.point * symbol_info.trade_contract_size)
             volume = max(symbol_info.volume_min, min(symbol_info.volume_max, volume))
@@ -465,3 +531,38 @@ def calculate_position_size_kelly(symbol, win_rate, avg_win, avg_loss, balance):
     except Exception as e:
         logging.error(f"Error in Kelly position sizing: {e}")
         return 0.01
+
+def calculate_position_size_kelly_batch(symbols, win_rates, avg_wins, avg_losses, balance):
+    """Kelly position sizes for several symbols at once, as a numpy array"""
+    try:
+        p = np.asarray(win_rates, dtype=float)
+        avg_wins = np.asarray(avg_wins, dtype=float)
+        avg_losses = np.asarray(avg_losses, dtype=float)
+        
+        # Same inputs calculate_position_size_kelly would fall back on
+        valid = (avg_losses > 0) & (avg_wins != 0) & (p > 0) & (p < 1)
+        
+        point = np.zeros(len(symbols))
+        contract = np.zeros(len(symbols))
+        volume_min = np.zeros(len(symbols))
+        volume_max = np.zeros(len(symbols))
+        for i, symbol in enumerate(symbols):
+            symbol_info = mt5_helper.get_symbol_info(symbol)
+            if symbol_info:
+                point[i] = symbol_info.point
+                contract[i] = symbol_info.trade_contract_size
+                volume_min[i] = symbol_info.volume_min
+                volume_max[i] = symbol_info.volume_max
+        valid &= point > 0
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            b = avg_wins / np.abs(avg_losses)
+            kelly_fraction = np.clip((b * p - (1 - p)) / b, 0.01, 0.25)
+            volume = balance * kelly_fraction / (100 * point * contract)
+        
+        volume = np.round(np.clip(volume, volume_min, volume_max), 2)
+        return np.where(valid, volume, 0.01)
+        
+    except Exception as e:
+        logging.error(f"Error in batch Kelly position sizing: {e}")
+        return np.full(len(symbols), 0.01)
@@ -1,12 +1,14 @@
-from flask import render_template, request, jsonify, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash
 from app import app, db, socketio
 from models import Account, Trade, BacktestResult, SystemLog
 from sqlalchemy import func, desc
+from sqlalchemy.orm import raiseload
 from datetime import datetime, timedelta
-import json
 import os
-from backtesting import BacktestEngine
 from notifications import NotificationManager
+import bot_state
+from json_utils import ojsonify, stream_list_response
+import response_cache
 
 @app.route('/')
 def dashboard():
@@ -31,8 +33,8 @@ def settings():
 @app.route('/api/accounts')
 def api_accounts():
     """Get all accounts with current status"""
-    accounts = Account.query.all()
-    return jsonify([account.to_dict() for account in accounts])
+    accounts = Account.query.options(raiseload('*')).all()
+    return ojsonify([account.to_dict() for account in accounts])
 
 @app.route('/api/trades')
 def api_trades():
@@ -42,67 +44,58 @@ def api_trades():
     status = request.args.get('status', 'all')
     symbol = request.args.get('symbol', 'all')
     
-    query = Trade.query
+    criteria = []
     
     if status != 'all':
-        query = query.filter(Trade.status == status.upper())
+        criteria.append(Trade.status == status.upper())
     if symbol != 'all':
-        query = query.filter(Trade.symbol == symbol)
+        criteria.append(Trade.symbol == symbol)
     
-    trades = query.order_by(desc(Trade.open_time)).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    trades, total, pages = Trade.page_dicts(criteria, page, per_page)
     
-    return jsonify({
-        'trades': [trade.to_dict() for trade in trades.items],
-        'total': trades.total,
-        'pages': trades.pages,
-        'current_page': page
-    })
+    return stream_list_response('trades', trades, total=total, pages=pages, current_page=page)
+
+# Seconds analytics responses are served from cache; closing a trade clears them
+ANALYTICS_CACHE_TTL = 30
+
+# Longest daily P&L history served; also bounds the number of cache keys
+MAX_DAILY_PNL_DAYS = 365
 
 @app.route('/api/analytics/summary')
 def api_analytics_summary():
     """Get trading analytics summary"""
+    return response_cache.cached_json('analytics:summary:30d', ANALYTICS_CACHE_TTL, _analytics_summary)
+
+def _analytics_summary():
     # Get data for the last 30 days
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
     
-    # Total trades
-    total_trades = Trade.query.filter(Trade.open_time >= thirty_days_ago).count()
+    recent = Trade.open_time >= thirty_days_ago
+    is_closed = Trade.status == 'CLOSED'
     
-    # Winning/losing trades
-    winning_trades = Trade.query.filter(
-        Trade.open_time >= thirty_days_ago,
-        Trade.profit > 0,
-        Trade.status == 'CLOSED'
-    ).count()
-    
-    losing_trades = Trade.query.filter(
-        Trade.open_time >= thirty_days_ago,
-        Trade.profit < 0,
-        Trade.status == 'CLOSED'
-    ).count()
-    
-    # Total profit/loss
-    total_profit = db.session.query(func.sum(Trade.profit)).filter(
-        Trade.open_time >= thirty_days_ago,
-        Trade.status == 'CLOSED'
-    ).scalar() or 0
+    # One aggregate query: the total counts trades of every status, while the
+    # win/loss counts, profit and best/worst profit cover closed trades only
+    closed = Trade.stats(recent, subset=is_closed)
+    total_trades = closed['total_trades']
+    winning_trades = closed['winning_trades']
+    losing_trades = closed['losing_trades']
+    total_profit = closed['total_profit']
     
     # Win rate
     win_rate = (winning_trades / (winning_trades + losing_trades) * 100) if (winning_trades + losing_trades) > 0 else 0
     
-    # Best and worst trades
-    best_trade = Trade.query.filter(
-        Trade.open_time >= thirty_days_ago,
-        Trade.status == 'CLOSED'
-    ).order_by(desc(Trade.profit)).first()
-    
-    worst_trade = Trade.query.filter(
-        Trade.open_time >= thirty_days_ago,
-        Trade.status == 'CLOSED'
-    ).order_by(Trade.profit).first()
+    # Best and worst trades, fetched together by their known profit
+    best_trade = worst_trade = None
+    if closed['best_profit'] is not None:
+        extremes = Trade.query.filter(
+            recent,
+            is_closed,
+            Trade.profit.in_((closed['best_profit'], closed['worst_profit']))
+        ).order_by(desc(Trade.profit)).all()
+        if extremes:
+            best_trade, worst_trade = extremes[0], extremes[-1]
     
-    return jsonify({
+    return {
         'total_trades': total_trades,
         'winning_trades': winning_trades,
         'losing_trades': losing_trades,
@@ -110,27 +103,33 @@ def api_analytics_summary():
         'total_profit': round(total_profit, 2),
         'best_trade': best_trade.to_dict() if best_trade else None,
         'worst_trade': worst_trade.to_dict() if worst_trade else None
-    })
+    }
 
 @app.route('/api/analytics/daily_pnl')
 def api_daily_pnl():
     """Get daily P&L data for charts"""
-    days = request.args.get('days', 30, type=int)
+    days = min(max(request.args.get('days', 30, type=int), 1), MAX_DAILY_PNL_DAYS)
+    return response_cache.cached_json(f'analytics:daily_pnl:{days}', ANALYTICS_CACHE_TTL,
+                                      lambda: _daily_pnl(days))
+
+def _daily_pnl(days):
     start_date = datetime.utcnow() - timedelta(days=days)
     
-    # Query daily P&L
+    # Query daily P&L. The filter is a range scan on the (status, close_time,
+    # profit) index; typing the day as Date makes SQLite's text result a date too
+    day = func.date(Trade.close_time, type_=db.Date)
     daily_pnl = db.session.query(
-        func.date(Trade.close_time).label('date'),
+        day.label('date'),
         func.sum(Trade.profit).label('profit')
     ).filter(
         Trade.close_time >= start_date,
         Trade.status == 'CLOSED'
-    ).group_by(func.date(Trade.close_time)).order_by('date').all()
+    ).group_by(day).order_by('date').all()
     
-    return jsonify([{
+    return [{
         'date': row.date.isoformat() if row.date else None,
         'profit': float(row.profit) if row.profit else 0
-    } for row in daily_pnl])
+    } for row in daily_pnl]
 
 @app.route('/api/control', methods=['POST'])
 def api_control():
@@ -138,20 +137,19 @@ def api_control():
     action = request.json.get('action')
     
     if action not in ['pause', 'resume']:
-        return jsonify({'error': 'Invalid action'}), 400
+        return ojsonify({'error': 'Invalid action'}), 400
     
     status = 'paused' if action == 'pause' else 'running'
     
     try:
-        with open('control.json', 'w') as f:
-            json.dump({'status': status}, f)
+        bot_state.set_control_status(status)
         
         # Emit status change to all clients
         socketio.emit('bot_status_changed', {'status': status})
         
-        return jsonify({'status': status, 'message': f'Bot is now {status}'})
+        return ojsonify({'status': status, 'message': f'Bot is now {status}'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}), 500
 
 @app.route('/api/backtest', methods=['POST'])
 def api_backtest():
@@ -159,24 +157,32 @@ def api_backtest():
     data = request.json
     
     try:
+        # Imported on first use; pulls in pandas and the strategy stack
+        from backtesting import BacktestEngine
+        
+        start_date = datetime.fromisoformat(data['start_date'])
+        end_date = datetime.fromisoformat(data['end_date'])
+        initial_balance = data.get('initial_balance', 10000)
+        
         engine = BacktestEngine()
         result = engine.run_backtest(
             strategy=data['strategy'],
             symbol=data['symbol'],
             timeframe=data['timeframe'],
-            start_date=datetime.fromisoformat(data['start_date']),
-            end_date=datetime.fromisoformat(data['end_date']),
-            initial_balance=data.get('initial_balance', 10000)
+            start_date=start_date,
+            end_date=end_date,
+            initial_balance=initial_balance,
+            columnar=bool(data.get('columnar', False))
         )
         
         # Save backtest result
-        backtest_result = BacktestResult(
+        BacktestResult.bulk_insert([dict(
             strategy_name=data['strategy'],
             symbol=data['symbol'],
             timeframe=data['timeframe'],
-            start_date=datetime.fromisoformat(data['start_date']),
-            end_date=datetime.fromisoformat(data['end_date']),
-            initial_balance=data.get('initial_balance', 10000),
+            start_date=start_date,
+            end_date=end_date,
+            initial_balance=initial_balance,
             final_balance=result['final_balance'],
             total_trades=result['total_trades'],
             winning_trades=result['winning_trades'],
@@ -184,44 +190,38 @@ def api_backtest():
             max_drawdown=result['max_drawdown'],
             sharpe_ratio=result['sharpe_ratio'],
             profit_factor=result['profit_factor']
-        )
-        
-        db.session.add(backtest_result)
-        db.session.commit()
+        )])
         
-        return jsonify(result)
+        return ojsonify(result)
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}), 500
 
 @app.route('/api/backtest/results')
 def api_backtest_results():
     """Get backtest results"""
     results = BacktestResult.query.order_by(desc(BacktestResult.created_at)).limit(20).all()
-    return jsonify([result.to_dict() for result in results])
+    return ojsonify([result.to_dict() for result in results])
 
 @app.route('/api/config')
 def api_config():
     """Get current configuration"""
     try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
-        return jsonify(config)
+        return ojsonify(bot_state.get_config())
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}), 500
 
 @app.route('/api/config', methods=['POST'])
 def api_config_update():
     """Update configuration"""
     try:
         config = request.json
-        with open('config.json', 'w') as f:
-            json.dump(config, f, indent=2)
+        bot_state.save_config(config)
         
         flash('Configuration updated successfully', 'success')
-        return jsonify({'message': 'Configuration updated successfully'})
+        return ojsonify({'message': 'Configuration updated successfully'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}), 500
 
 @app.route('/api/logs')
 def api_logs():
@@ -230,21 +230,14 @@ def api_logs():
     per_page = request.args.get('per_page', 100, type=int)
     level = request.args.get('level', 'all')
     
-    query = SystemLog.query
+    criteria = []
     
     if level != 'all':
-        query = query.filter(SystemLog.level == level.upper())
+        criteria.append(SystemLog.level == level.upper())
     
-    logs = query.order_by(desc(SystemLog.timestamp)).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    logs, total, pages = SystemLog.page_dicts(criteria, page, per_page)
     
-    return jsonify({
-        'logs': [log.to_dict() for log in logs.items],
-        'total': logs.total,
-        'pages': logs.pages,
-        'current_page': page
-    })
+    return stream_list_response('logs', logs, total=total, pages=pages, current_page=page)
 
 @app.route('/api/bot-control', methods=['POST'])
 def api_bot_control():
@@ -253,25 +246,36 @@ def api_bot_control():
         data = request.get_json()
         action = data.get('action')
         
-        control_data = {'status': action, 'timestamp': datetime.utcnow().isoformat()}
-        
-        with open('control.json', 'w') as f:
-            json.dump(control_data, f)
+        bot_state.set_control_status(action, timestamp=datetime.utcnow().isoformat())
         
         socketio.emit('bot_status_changed', {'status': action})
         
-        return jsonify({'success': True, 'message': f'Bot {action}d successfully'})
+        return ojsonify({'success': True, 'message': f'Bot {action}d successfully'})
     
     except Exception as e:
         logging.error(f"Error controlling bot: {e}")
-        return jsonify({'success': False, 'message': str(e)}), 500
+        return ojsonify({'success': False, 'message': str(e)}), 500
+
+def _trade_counts():
+    """Open positions and today's trade stats, cached until a trade is saved or closed"""
+    today = datetime.utcnow().date()
+    today_start = datetime.combine(today, datetime.min.time())
+    
+    def compute():
+        today_stats = Trade.stats(period=Trade.open_time >= today_start)
+        return {
+            'open_positions': today_stats.pop('open_trades'),
+            'today': today_stats,
+        }
+    
+    return bot_state.get_trade_counts(today, compute)
 
 @app.route('/api/dashboard/summary')
 def api_dashboard_summary():
     """Get dashboard summary data"""
     try:
         # Use database data if available, otherwise return demo data
-        accounts = Account.query.filter_by(enabled=True).all()
+        accounts = Account.query.options(raiseload('*')).filter_by(enabled=True).all()
         if not accounts:
             # Demo data for initial display
             mock_accounts = [
@@ -288,7 +292,7 @@ def api_dashboard_summary():
                     'enabled': True
                 }
             ]
-            return jsonify({
+            return ojsonify({
                 'accounts': mock_accounts,
                 'summary': {
                     'total_balance': 10000.0,
@@ -298,15 +302,16 @@ def api_dashboard_summary():
                 }
             })
         
+        # The enabled accounts are already loaded for the response, so summing
+        # them here costs less than another query
         total_balance = sum(acc.balance for acc in accounts)
         total_equity = sum(acc.equity for acc in accounts)
-        open_positions = Trade.query.filter_by(status='OPEN').count()
         
-        today = datetime.utcnow().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_trades = Trade.query.filter(Trade.open_time >= today_start).count()
+        counts = _trade_counts()
+        open_positions = counts['open_positions']
+        today_trades = counts['today']['total_trades']
         
-        return jsonify({
+        return ojsonify({
             'accounts': [acc.to_dict() for acc in accounts],
             'summary': {
                 'total_balance': total_balance,
@@ -318,36 +323,33 @@ def api_dashboard_summary():
     
     except Exception as e:
         logging.error(f"Error getting dashboard summary: {e}")
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}), 500
 
 @app.route('/api/dashboard/today-stats')  
 def api_today_stats():
     """Get today's trading statistics"""
     try:
-        today = datetime.utcnow().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        
-        today_trades = Trade.query.filter(Trade.open_time >= today_start).all()
+        today_stats = _trade_counts()['today']
         
-        if not today_trades:
+        if not today_stats['total_trades']:
             # Demo data if no trades
-            return jsonify({
+            return ojsonify({
                 'total_trades': 5,
                 'total_profit': 125.50,
                 'winning_trades': 4,
                 'win_rate': 80.0
             })
         
-        total_profit = sum(trade.profit for trade in today_trades if trade.profit)
-        winning_trades = len([t for t in today_trades if t.profit and t.profit > 0])
+        total_trades = today_stats['total_trades']
+        winning_trades = today_stats['winning_trades']
         
-        return jsonify({
-            'total_trades': len(today_trades),
-            'total_profit': total_profit,
+        return ojsonify({
+            'total_trades': total_trades,
+            'total_profit': today_stats['total_profit'],
             'winning_trades': winning_trades,
-            'win_rate': (winning_trades / len(today_trades) * 100) if today_trades else 0
+            'win_rate': winning_trades / total_trades * 100
         })
     
     except Exception as e:
         logging.error(f"Error getting today's stats: {e}")
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}), 500
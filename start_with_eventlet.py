@@ -4,7 +4,6 @@ Start the Forex Trading Bot with eventlet for better WebSocket support
 """
 
 import os
-import threading
 import time
 import logging
 import eventlet
@@ -16,7 +15,7 @@ from app import app, socketio
 from trading_engine import TradingEngine
 
 def start_trading_engine():
-    """Start the trading engine in a separate thread"""
+    """Run the trading engine as a Socket.IO background task"""
     time.sleep(3)  # Wait for app to start
     engine = TradingEngine()
     engine.start()
@@ -27,8 +26,7 @@ if __name__ == "__main__":
     os.environ.setdefault("DATABASE_URL", "sqlite:///forex_bot.db")
     
     # Start trading engine in background
-    trading_thread = threading.Thread(target=start_trading_engine, daemon=True)
-    trading_thread.start()
+    socketio.start_background_task(start_trading_engine)
     
     # Start Flask-SocketIO server with eventlet
     print("Starting Forex Trading Bot Dashboard with eventlet...")
@@ -118,6 +118,17 @@ class WebSocketManager {
             this.trigger('dashboard_update', data);
         });
 
+        // A trading session's opened trades and final dashboard in one frame
+        this.socket.on('batch_update', (data) => {
+            (data.trades || []).forEach((trade) => {
+                this.trigger('trade_opened', trade);
+                this.showTradeNotification('opened', trade);
+            });
+            if (data.dashboard) {
+                this.trigger('dashboard_update', data.dashboard);
+            }
+        });
+
         // System events
         this.socket.on('system_log', (data) => {
             this.trigger('system_log', data);
@@ -1,33 +1,220 @@
-import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import logging
+from jit_utils import njit, NUMBA_AVAILABLE
 
-def _sma_crossover_signal(df):
+# Rolling SMA sums per cache key, advanced one closed bar at a time
+_INDICATOR_STATE = {}
+
+# Re-sum from scratch after this many incremental steps to bound float drift
+_SMA_RESEED_BARS = 500
+
+# Latest RSI per cache key, shared by the strategies that filter on it
+_RSI_CACHE = {}
+
+def _has_field(rates, name):
+    """Whether ``rates`` (MT5 structured array or DataFrame) has a field"""
+    names = getattr(getattr(rates, 'dtype', None), 'names', None)
+    if names is not None:
+        return name in names
+    return name in getattr(rates, 'columns', ())
+
+def _bars_key(df):
+    """Length plus time, close and volume of the newest bar, or None without times
+
+    The newest bar is still forming, so its close and volume are part of the
+    key; earlier bars are closed and can't change for the same newest time.
+    """
+    if not _has_field(df, 'time'):
+        return None
+    volume = np.asarray(df['tick_volume'])[-1] if _has_field(df, 'tick_volume') else None
+    return len(df), np.asarray(df['time'])[-1], np.asarray(df['close'])[-1], volume
+
+@njit(cache=True)
+def _wilder_smooth(gains, losses, period):
+    """Wilder-smoothed average gain and loss, seeded with a simple average"""
+    avg_gain = gains[:period].mean()
+    avg_loss = losses[:period].mean()
+    for i in range(period, len(gains)):
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+    return avg_gain, avg_loss
+
+@njit(cache=True)
+def _wilder_smooth_series(gains, losses, period):
+    """Wilder averages after each bar, NaN until the seed window is full"""
+    n = len(gains) + 1
+    avg_gain = np.full(n, np.nan)
+    avg_loss = np.full(n, np.nan)
+    if len(gains) < period:
+        return avg_gain, avg_loss
+    avg_gain[period] = gains[:period].mean()
+    avg_loss[period] = losses[:period].mean()
+    for i in range(period + 1, n):
+        avg_gain[i] = (avg_gain[i - 1] * (period - 1) + gains[i - 1]) / period
+        avg_loss[i] = (avg_loss[i - 1] * (period - 1) + losses[i - 1]) / period
+    return avg_gain, avg_loss
+
+@njit(cache=True)
+def _slide_sums(close, start, stop, fast, slow, fast_sum, slow_sum):
+    """Advance rolling fast/slow sums from bar ``start`` to bar ``stop``"""
+    for j in range(start + 1, stop + 1):
+        fast_sum += close[j] - close[j - fast]
+        slow_sum += close[j] - close[j - slow]
+    return fast_sum, slow_sum
+
+@njit(cache=True)
+def _ewm_update(mean, weight, x, decay):
+    """One step of pandas' adjusted ``ewm().mean()``: returns the new mean and weight"""
+    weight *= decay
+    if mean != x:
+        mean = (weight * mean + x) / (weight + 1.0)
+    return mean, weight + 1.0
+
+@njit(cache=True)
+def _ema_tail(close, span):
+    """Previous and latest value of ``pd.Series(close).ewm(span=span).mean()``"""
+    decay = 1.0 - 2.0 / (span + 1.0)
+    mean = close[0]
+    prev = mean
+    weight = 1.0
+    for i in range(1, len(close)):
+        prev = mean
+        mean, weight = _ewm_update(mean, weight, close[i], decay)
+    return prev, mean
+
+@njit(cache=True)
+def _macd_histogram(close):
+    """Latest 12/26/9 MACD histogram, computed like the pandas ewm version"""
+    fast_decay = 1.0 - 2.0 / 13.0
+    slow_decay = 1.0 - 2.0 / 27.0
+    signal_decay = 1.0 - 2.0 / 10.0
+    fast = slow = close[0]
+    signal = 0.0
+    fast_wt = slow_wt = signal_wt = 1.0
+    for i in range(1, len(close)):
+        fast, fast_wt = _ewm_update(fast, fast_wt, close[i], fast_decay)
+        slow, slow_wt = _ewm_update(slow, slow_wt, close[i], slow_decay)
+        signal, signal_wt = _ewm_update(signal, signal_wt, fast - slow, signal_decay)
+    return fast - slow - signal
+
+def warm_up():
+    """Compile the numba kernels so the first trading cycle doesn't pay for it"""
+    if not NUMBA_AVAILABLE:
+        return
+    close = np.linspace(1.0, 2.0, 25)
+    _wilder_smooth(close, close, 14)
+    _wilder_smooth_series(close, close, 14)
+    _slide_sums(close, 20, 23, 10, 20, 0.0, 0.0)
+    _ema_tail(close, 9)
+    _macd_histogram(close)
+
+def _wilder_rsi(close, period=14):
+    """Latest Wilder-smoothed RSI of a close-price array.
+
+    Returns NaN when there are not enough bars or no losses in the window,
+    both of which the strategies treat as "hold".
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if len(close) <= period:
+        return np.nan
+
+    diff = np.diff(close)
+    gains = np.where(diff > 0, diff, 0.0)
+    losses = np.where(diff < 0, -diff, 0.0)
+
+    # Seed with a simple average, then apply Wilder's smoothing to the tail
+    avg_gain, avg_loss = _wilder_smooth(gains, losses, period)
+
+    if avg_loss == 0:
+        return np.nan
+
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+def _latest_rsi(df, close, cache_key=None):
+    """``_wilder_rsi(close)``, computed once per stream and newest bar"""
+    bars_key = _bars_key(df) if cache_key is not None else None
+    if bars_key is not None:
+        cached = _RSI_CACHE.get(cache_key)
+        if cached is not None and cached[0] == bars_key:
+            return cached[1]
+    
+    rsi = _wilder_rsi(close)
+    if bars_key is not None:
+        _RSI_CACHE[cache_key] = (bars_key, rsi)
+    return rsi
+
+def _sma_pairs(df, cache_key=None, fast=10, slow=20):
+    """Fast/slow SMA values for the previous and the latest bar.
+
+    The last row returned by MT5 is the still-forming bar, so only sums up to
+    the last closed bar are cached per ``cache_key``. Each call slides those
+    sums over newly closed bars and derives the forming bar's SMAs from them.
+    Returns ``(fast_prev, slow_prev, fast_last, slow_last)`` or None when
+    there is not enough data.
+    """
+    close = np.asarray(df['close'], dtype=np.float64)
+    n = len(close)
+    if n < slow + 1:
+        return None
+
+    closed = n - 2
+    state = None
+    if cache_key is not None and _has_field(df, 'time'):
+        times = np.asarray(df['time'])
+        state = _INDICATOR_STATE.get(cache_key)
+        if state is not None and state['steps'] < _SMA_RESEED_BARS:
+            matches = np.flatnonzero(times == state['time'])
+            start = matches[0] if len(matches) else -1
+        else:
+            start = -1
+
+        if start >= slow - 1 and start <= closed:
+            fast_sum, slow_sum = _slide_sums(close, start, closed, fast, slow,
+                                             state['fast_sum'], state['slow_sum'])
+            steps = state['steps'] + closed - start
+        else:
+            fast_sum = close[closed - fast + 1:closed + 1].sum()
+            slow_sum = close[closed - slow + 1:closed + 1].sum()
+            steps = 0
+
+        _INDICATOR_STATE[cache_key] = {
+            'time': times[closed],
+            'fast_sum': fast_sum,
+            'slow_sum': slow_sum,
+            'steps': steps,
+        }
+    else:
+        fast_sum = close[closed - fast + 1:closed + 1].sum()
+        slow_sum = close[closed - slow + 1:closed + 1].sum()
+
+    fast_last = fast_sum - close[closed - fast + 1] + close[-1]
+    slow_last = slow_sum - close[closed - slow + 1] + close[-1]
+    return fast_sum / fast, slow_sum / slow, fast_last / fast, slow_last / slow
+
+def _sma_crossover_signal(df, cache_key=None):
     """Generates a signal based on a 10/20 SMA crossover with additional filters"""
     try:
-        df['SMA10'] = df['close'].rolling(window=10).mean()
-        df['SMA20'] = df['close'].rolling(window=20).mean()
+        smas = _sma_pairs(df, cache_key)
+        if smas is None:
+            return "hold"
+        sma10_prev, sma20_prev, sma10_last, sma20_last = smas
         
         # Add volume filter if available
-        if 'tick_volume' in df.columns:
-            df['avg_volume'] = df['tick_volume'].rolling(window=20).mean()
-            volume_filter = df['tick_volume'].iloc[-1] > df['avg_volume'].iloc[-1] * 1.2
+        if _has_field(df, 'tick_volume'):
+            volume = np.asarray(df['tick_volume'], dtype=np.float64)
+            volume_filter = len(volume) >= 20 and volume[-1] > volume[-20:].mean() * 1.2
         else:
             volume_filter = True
-
-        last_row = df.iloc[-1]
-        prev_row = df.iloc[-2]
-
-        if pd.isna(last_row['SMA10']) or pd.isna(last_row['SMA20']):
-            return "hold"
         
         # Check for crossover with volume confirmation
-        if (prev_row['SMA10'] <= prev_row['SMA20'] and 
-            last_row['SMA10'] > last_row['SMA20'] and volume_filter):
+        if (sma10_prev <= sma20_prev and 
+            sma10_last > sma20_last and volume_filter):
             logging.info("SMA Crossover: Bullish signal with volume confirmation")
             return "buy"
-        elif (prev_row['SMA10'] >= prev_row['SMA20'] and 
-              last_row['SMA10'] < last_row['SMA20'] and volume_filter):
+        elif (sma10_prev >= sma20_prev and 
+              sma10_last < sma20_last and volume_filter):
             logging.info("SMA Crossover: Bearish signal with volume confirmation")
             return "sell"
         else:
@@ -37,28 +224,17 @@ def _sma_crossover_signal(df):
         logging.error(f"Error in SMA crossover strategy: {e}")
         return "hold"
 
-def _rsi_scalping_signal(df):
+def _rsi_scalping_signal(df, cache_key=None):
     """Enhanced RSI scalping with momentum confirmation"""
     try:
-        # Calculate RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        
-        if loss.sum() == 0:
-            return "hold"
-            
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-        
-        # Add momentum filter
-        df['momentum'] = df['close'] - df['close'].shift(5)
-        
-        last_rsi = df['RSI'].iloc[-1]
-        momentum = df['momentum'].iloc[-1]
+        close = np.asarray(df['close'], dtype=np.float64)
+        last_rsi = _latest_rsi(df, close, cache_key)
 
-        if pd.isna(last_rsi):
+        if np.isnan(last_rsi) or len(close) < 6:
             return "hold"
+
+        # Add momentum filter
+        momentum = close[-1] - close[-6]
         
         # Enhanced RSI signals with momentum confirmation
         if last_rsi > 75 and momentum < 0:  # Stronger overbought with negative momentum
@@ -74,55 +250,44 @@ def _rsi_scalping_signal(df):
         logging.error(f"Error in RSI scalping strategy: {e}")
         return "hold"
 
-def _sma_rsi_combo_signal(df):
+def _sma_rsi_combo_signal(df, cache_key=None):
     """Enhanced SMA+RSI combo with additional technical filters"""
     try:
         # SMA Logic
-        df['SMA10'] = df['close'].rolling(window=10).mean()
-        df['SMA20'] = df['close'].rolling(window=20).mean()
-        df['SMA50'] = df['close'].rolling(window=50).mean()
+        smas = _sma_pairs(df, cache_key)
+        if smas is None:
+            return "hold"
+        sma10_prev, sma20_prev, sma10_last, sma20_last = smas
+        close = np.asarray(df['close'], dtype=np.float64)
+        last_close = close[-1]
+        sma50 = close[-50:].mean() if len(close) >= 50 else np.nan
         
         # RSI Logic
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        last_rsi = _latest_rsi(df, close, cache_key)
         
-        if loss.sum() == 0:
+        if np.isnan(last_rsi):
             return "hold"
-            
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
         
         # MACD for additional confirmation
-        df['EMA12'] = df['close'].ewm(span=12).mean()
-        df['EMA26'] = df['close'].ewm(span=26).mean()
-        df['MACD'] = df['EMA12'] - df['EMA26']
-        df['MACD_signal'] = df['MACD'].ewm(span=9).mean()
-        df['MACD_histogram'] = df['MACD'] - df['MACD_signal']
-        
-        last_row = df.iloc[-1]
-        prev_row = df.iloc[-2]
-        
-        if pd.isna(last_row['SMA10']) or pd.isna(last_row['RSI']):
-            return "hold"
+        macd_histogram = _macd_histogram(close)
         
         # Trend filter using SMA50
-        trend_up = last_row['close'] > last_row['SMA50']
-        trend_down = last_row['close'] < last_row['SMA50']
+        trend_up = last_close > sma50
+        trend_down = last_close < sma50
         
         # SMA crossover signals
-        sma_buy = (prev_row['SMA10'] <= prev_row['SMA20'] and 
-                  last_row['SMA10'] > last_row['SMA20'])
-        sma_sell = (prev_row['SMA10'] >= prev_row['SMA20'] and 
-                   last_row['SMA10'] < last_row['SMA20'])
+        sma_buy = (sma10_prev <= sma20_prev and 
+                  sma10_last > sma20_last)
+        sma_sell = (sma10_prev >= sma20_prev and 
+                   sma10_last < sma20_last)
         
         # RSI conditions
-        rsi_bullish = 40 < last_row['RSI'] < 70
-        rsi_bearish = 30 < last_row['RSI'] < 60
+        rsi_bullish = 40 < last_rsi < 70
+        rsi_bearish = 30 < last_rsi < 60
         
         # MACD confirmation
-        macd_bullish = last_row['MACD_histogram'] > 0
-        macd_bearish = last_row['MACD_histogram'] < 0
+        macd_bullish = macd_histogram > 0
+        macd_bearish = macd_histogram < 0
         
         # Combined signals with multiple confirmations
         if (sma_buy and rsi_bullish and macd_bullish and trend_up):
@@ -138,38 +303,32 @@ def _sma_rsi_combo_signal(df):
         logging.error(f"Error in SMA+RSI combo strategy: {e}")
         return "hold"
 
-def _bollinger_bands_signal(df):
+def _bollinger_bands_signal(df, cache_key=None):
     """Bollinger Bands mean reversion strategy"""
     try:
         window = 20
-        df['SMA20'] = df['close'].rolling(window=window).mean()
-        df['std'] = df['close'].rolling(window=window).std()
-        df['upper_band'] = df['SMA20'] + (df['std'] * 2)
-        df['lower_band'] = df['SMA20'] - (df['std'] * 2)
+        close = np.asarray(df['close'], dtype=np.float64)
         
         # RSI for additional confirmation
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        last_rsi = _latest_rsi(df, close, cache_key)
         
-        if loss.sum() == 0:
+        if len(close) < window or np.isnan(last_rsi):
             return "hold"
-            
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
         
-        last_row = df.iloc[-1]
-        
-        if pd.isna(last_row['upper_band']) or pd.isna(last_row['RSI']):
-            return "hold"
+        # Bands from the latest window only
+        sma20 = close[-window:].mean()
+        std = close[-window:].std(ddof=1)
+        upper_band = sma20 + (std * 2)
+        lower_band = sma20 - (std * 2)
+        last_close = close[-1]
         
         # Signal generation
-        if (last_row['close'] <= last_row['lower_band'] and 
-            last_row['RSI'] < 30):
+        if (last_close <= lower_band and 
+            last_rsi < 30):
             logging.info("Bollinger Bands: Oversold bounce signal")
             return "buy"
-        elif (last_row['close'] >= last_row['upper_band'] and 
-              last_row['RSI'] > 70):
+        elif (last_close >= upper_band and 
+              last_rsi > 70):
             logging.info("Bollinger Bands: Overbought reversal signal")
             return "sell"
         else:
@@ -179,30 +338,32 @@ def _bollinger_bands_signal(df):
         logging.error(f"Error in Bollinger Bands strategy: {e}")
         return "hold"
 
-def _ema_crossover_signal(df):
+def _ema_crossover_signal(df, cache_key=None):
     """EMA crossover strategy with trend confirmation"""
     try:
-        df['EMA9'] = df['close'].ewm(span=9).mean()
-        df['EMA21'] = df['close'].ewm(span=21).mean()
-        df['EMA50'] = df['close'].ewm(span=50).mean()
+        close = np.asarray(df['close'], dtype=np.float64)
+        if len(close) < 2:
+            return "hold"
         
-        last_row = df.iloc[-1]
-        prev_row = df.iloc[-2]
+        # Only the last two EMA values are needed, so skip building full series
+        ema9_prev, ema9 = _ema_tail(close, 9)
+        ema21_prev, ema21 = _ema_tail(close, 21)
+        ema50 = _ema_tail(close, 50)[1]
         
-        if pd.isna(last_row['EMA9']) or pd.isna(last_row['EMA21']):
+        if np.isnan(ema9) or np.isnan(ema21):
             return "hold"
         
         # Trend confirmation
-        trend_up = last_row['EMA21'] > last_row['EMA50']
-        trend_down = last_row['EMA21'] < last_row['EMA50']
+        trend_up = ema21 > ema50
+        trend_down = ema21 < ema50
         
         # Crossover signals
-        if (prev_row['EMA9'] <= prev_row['EMA21'] and 
-            last_row['EMA9'] > last_row['EMA21'] and trend_up):
+        if (ema9_prev <= ema21_prev and 
+            ema9 > ema21 and trend_up):
             logging.info("EMA Crossover: Bullish signal with trend confirmation")
             return "buy"
-        elif (prev_row['EMA9'] >= prev_row['EMA21'] and 
-              last_row['EMA9'] < last_row['EMA21'] and trend_down):
+        elif (ema9_prev >= ema21_prev and 
+              ema9 < ema21 and trend_down):
             logging.info("EMA Crossover: Bearish signal with trend confirmation")
             return "sell"
         else:
@@ -212,33 +373,190 @@ def _ema_crossover_signal(df):
         logging.error(f"Error in EMA crossover strategy: {e}")
         return "hold"
 
-def get_signal(df, strategy_name):
-    """Router function to get a signal from the chosen strategy"""
-    try:
-        if strategy_name == "sma_crossover":
-            return _sma_crossover_signal(df)
-        elif strategy_name == "rsi_scalping":
-            return _rsi_scalping_signal(df)
-        elif strategy_name == "sma_rsi_combo":
-            return _sma_rsi_combo_signal(df)
-        elif strategy_name == "bollinger_bands":
-            return _bollinger_bands_signal(df)
-        elif strategy_name == "ema_crossover":
-            return _ema_crossover_signal(df)
-        else:
+# Strategy name -> signal function taking (df, cache_key)
+_STRATEGIES = {
+    "sma_crossover": _sma_crossover_signal,
+    "rsi_scalping": _rsi_scalping_signal,
+    "sma_rsi_combo": _sma_rsi_combo_signal,
+    "bollinger_bands": _bollinger_bands_signal,
+    "ema_crossover": _ema_crossover_signal,
+}
+
+# Unknown strategy names already warned about
+_unknown_strategies = set()
+
+# (strategy name, cache_key) -> (bars key, signal) from the latest call, so
+# repeated calls on unchanged bars (e.g. accounts sharing a server) reuse it
+_SIGNAL_CACHE = {}
+
+def get_signal(df, strategy_name, cache_key=None):
+    """Router function to get a signal from the chosen strategy
+
+    ``cache_key`` identifies the data stream (e.g. server, symbol and
+    timeframe) so SMA strategies can reuse sums from the previous call, and
+    the previous signal is returned as-is while the newest bar is unchanged.
+    """
+    fn = _STRATEGIES.get(strategy_name)
+    if fn is None:
+        if strategy_name not in _unknown_strategies:
+            _unknown_strategies.add(strategy_name)
             logging.warning(f"Strategy '{strategy_name}' not found. Defaulting to 'hold'.")
-            return "hold"
-            
+        return "hold"
+    
+    try:
+        bars_key = _bars_key(df) if cache_key is not None else None
+        if bars_key is not None:
+            cached = _SIGNAL_CACHE.get((strategy_name, cache_key))
+            if cached is not None and cached[0] == bars_key:
+                return cached[1]
+        
+        signal = fn(df, cache_key)
+        if bars_key is not None:
+            _SIGNAL_CACHE[(strategy_name, cache_key)] = (bars_key, signal)
+        return signal
     except Exception as e:
         logging.error(f"Error in get_signal for strategy {strategy_name}: {e}")
         return "hold"
 
 def get_available_strategies():
     """Get list of available trading strategies"""
-    return [
-        "sma_crossover",
-        "rsi_scalping", 
-        "sma_rsi_combo",
-        "bollinger_bands",
-        "ema_crossover"
-    ]
+    return list(_STRATEGIES)
+
+# Full-series signals for backtesting. Each function returns, for every bar i,
+# the signal get_signal() gives for the bars up to and including i, encoded
+# as 1 (buy), -1 (sell) or 0 (hold). The arithmetic mirrors the single-bar
+# versions so both agree exactly.
+
+def _window_sums(x, window):
+    """Sum of the ``window`` values ending at each bar, NaN before that"""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).sum(axis=1)
+    return out
+
+def _window_means(x, window):
+    """Mean of the ``window`` values ending at each bar, NaN before that"""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).mean(axis=1)
+    return out
+
+def _lag(x, k):
+    """``x`` shifted ``k`` bars later, NaN-padded"""
+    out = np.full(len(x), np.nan)
+    out[k:] = x[:len(x) - k]
+    return out
+
+def _sma_pair_series(close, fast=10, slow=20):
+    """Per-bar (fast_prev, slow_prev, fast_last, slow_last) as in _sma_pairs"""
+    fast_sum = _lag(_window_sums(close, fast), 1)
+    slow_sum = _lag(_window_sums(close, slow), 1)
+    fast_last = fast_sum - _lag(close, fast) + close
+    slow_last = slow_sum - _lag(close, slow) + close
+    return fast_sum / fast, slow_sum / slow, fast_last / fast, slow_last / slow
+
+def _wilder_rsi_series(close, period=14):
+    """Per-bar Wilder RSI, NaN where _wilder_rsi() would be NaN"""
+    diff = np.diff(close)
+    gains = np.where(diff > 0, diff, 0.0)
+    losses = np.where(diff < 0, -diff, 0.0)
+    avg_gain, avg_loss = _wilder_smooth_series(gains, losses, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+    rsi[avg_loss == 0] = np.nan
+    return rsi
+
+def _encode(buy, sell):
+    signals = np.zeros(len(buy), dtype=np.int8)
+    signals[buy] = 1
+    signals[sell] = -1
+    return signals
+
+def _sma_crossover_signals(df):
+    close = np.asarray(df['close'], dtype=np.float64)
+    sma10_prev, sma20_prev, sma10_last, sma20_last = _sma_pair_series(close)
+    
+    if _has_field(df, 'tick_volume'):
+        volume = np.asarray(df['tick_volume'], dtype=np.float64)
+        volume_filter = volume > _window_means(volume, 20) * 1.2
+    else:
+        volume_filter = np.ones(len(close), dtype=bool)
+    
+    buy = (sma10_prev <= sma20_prev) & (sma10_last > sma20_last) & volume_filter
+    sell = (sma10_prev >= sma20_prev) & (sma10_last < sma20_last) & volume_filter
+    return _encode(buy, sell)
+
+def _rsi_scalping_signals(df):
+    close = np.asarray(df['close'], dtype=np.float64)
+    rsi = _wilder_rsi_series(close)
+    momentum = close - _lag(close, 5)
+    return _encode((rsi < 25) & (momentum > 0), (rsi > 75) & (momentum < 0))
+
+def _sma_rsi_combo_signals(df):
+    import pandas as pd
+    
+    close = np.asarray(df['close'], dtype=np.float64)
+    sma10_prev, sma20_prev, sma10_last, sma20_last = _sma_pair_series(close)
+    sma50 = _window_means(close, 50)
+    rsi = _wilder_rsi_series(close)
+    
+    close_series = pd.Series(close)
+    macd = close_series.ewm(span=12).mean() - close_series.ewm(span=26).mean()
+    macd_histogram = (macd - macd.ewm(span=9).mean()).to_numpy()
+    
+    buy = ((sma10_prev <= sma20_prev) & (sma10_last > sma20_last) &
+           (40 < rsi) & (rsi < 70) & (macd_histogram > 0) & (close > sma50))
+    sell = ((sma10_prev >= sma20_prev) & (sma10_last < sma20_last) &
+            (30 < rsi) & (rsi < 60) & (macd_histogram < 0) & (close < sma50))
+    return _encode(buy, sell)
+
+def _bollinger_bands_signals(df):
+    close = np.asarray(df['close'], dtype=np.float64)
+    rsi = _wilder_rsi_series(close)
+    
+    window = 20
+    sma20 = np.full(len(close), np.nan)
+    std = np.full(len(close), np.nan)
+    if len(close) >= window:
+        windows = sliding_window_view(close, window)
+        sma20[window - 1:] = windows.mean(axis=1)
+        std[window - 1:] = windows.std(axis=1, ddof=1)
+    upper_band = sma20 + (std * 2)
+    lower_band = sma20 - (std * 2)
+    
+    return _encode((close <= lower_band) & (rsi < 30), (close >= upper_band) & (rsi > 70))
+
+def _ema_crossover_signals(df):
+    import pandas as pd
+    
+    close = pd.Series(np.asarray(df['close'], dtype=np.float64))
+    ema9 = close.ewm(span=9).mean().to_numpy()
+    ema21 = close.ewm(span=21).mean().to_numpy()
+    ema50 = close.ewm(span=50).mean().to_numpy()
+    ema9_prev, ema21_prev = _lag(ema9, 1), _lag(ema21, 1)
+    
+    buy = (ema9_prev <= ema21_prev) & (ema9 > ema21) & (ema21 > ema50)
+    sell = (ema9_prev >= ema21_prev) & (ema9 < ema21) & (ema21 < ema50)
+    return _encode(buy, sell)
+
+_SIGNAL_SERIES = {
+    "sma_crossover": _sma_crossover_signals,
+    "rsi_scalping": _rsi_scalping_signals,
+    "sma_rsi_combo": _sma_rsi_combo_signals,
+    "bollinger_bands": _bollinger_bands_signals,
+    "ema_crossover": _ema_crossover_signals,
+}
+
+def get_signals(df, strategy_name):
+    """Signal for every bar at once: 1 (buy), -1 (sell) or 0 (hold)
+    
+    Bar i gets the signal get_signal() would return for the bars up to and
+    including i, so a backtest can precompute all of them in one pass.
+    """
+    fn = _SIGNAL_SERIES.get(strategy_name)
+    if fn is None:
+        if strategy_name not in _unknown_strategies:
+            _unknown_strategies.add(strategy_name)
+            logging.warning(f"Strategy '{strategy_name}' not found. Defaulting to 'hold'.")
+        return np.zeros(len(df), dtype=np.int8)
+    return fn(df)
@@ -0,0 +1,19 @@
+"""
+Shared test setup for TradeEngine
+"""
+import sys
+import os
+import types
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing app must not need eventlet or touch forex_bot.db
+os.environ.setdefault("SOCKETIO_ASYNC_MODE", "threading")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+# MetaTrader5 only installs on Windows; the tested code never calls into it
+try:
+    import MetaTrader5
+except ImportError:
+    sys.modules["MetaTrader5"] = types.ModuleType("MetaTrader5")
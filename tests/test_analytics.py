@@ -0,0 +1,82 @@
+"""
+Analytics summary tests for TradeEngine
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import Trade, Account
+import response_cache
+
+
+@pytest.fixture
+def seeded_trades():
+    """Mixed OPEN and CLOSED trades in the test database"""
+    now = datetime.utcnow()
+    rows = [
+        # Open trades carry floating profit, which the summary must ignore
+        ('OPEN', 50.0, now),
+        ('OPEN', -30.0, now - timedelta(days=2)),
+        ('CLOSED', 20.0, now - timedelta(days=1)),
+        ('CLOSED', 15.0, now - timedelta(days=3)),
+        ('CLOSED', -10.0, now - timedelta(days=5)),
+        # Outside the 30 day window
+        ('CLOSED', 99.0, now - timedelta(days=40)),
+    ]
+    with app.app_context():
+        account = Account(name='Test', login=12345, server='Demo')
+        db.session.add(account)
+        db.session.flush()
+        for ticket, (status, profit, open_time) in enumerate(rows, start=1):
+            db.session.add(Trade(
+                account_id=account.id, ticket=ticket, symbol='EURUSD', trade_type='BUY',
+                volume=0.1, price_open=1.1, status=status, profit=profit, open_time=open_time
+            ))
+        db.session.commit()
+    response_cache.invalidate('analytics:')
+
+    yield
+
+    with app.app_context():
+        Trade.query.delete()
+        Account.query.delete()
+        db.session.commit()
+    response_cache.invalidate('analytics:')
+
+
+def test_summary_counts_all_statuses_but_scores_closed_trades(seeded_trades):
+    """total_trades counts open trades too; wins, losses and profit are closed only"""
+    summary = app.test_client().get('/api/analytics/summary').get_json()
+
+    assert summary['total_trades'] == 5
+    assert summary['winning_trades'] == 2
+    assert summary['losing_trades'] == 1
+    assert summary['win_rate'] == round(2 / 3 * 100, 2)
+    assert summary['total_profit'] == 25.0
+    assert summary['best_trade']['profit'] == 20.0
+    assert summary['worst_trade']['profit'] == -10.0
+
+
+def test_stats_subset_matches_summary(seeded_trades):
+    """Trade.stats with a subset keeps the total over every matching trade"""
+    with app.app_context():
+        stats = Trade.stats(
+            Trade.open_time >= datetime.utcnow() - timedelta(days=30),
+            subset=Trade.status == 'CLOSED'
+        )
+
+    assert stats['total_trades'] == 5
+    assert stats['open_trades'] == 2
+    assert stats['gross_profit'] == 35.0
+    assert stats['gross_loss'] == 10.0
+    assert stats['best_profit'] == 20.0
+    assert stats['worst_profit'] == -10.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,56 @@
+"""
+Bar cache tests for TradeEngine
+"""
+import pytest
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: F401  (import before mt5_helper to avoid a circular import)
+import mt5_helper
+
+RATE_DTYPE = [('time', 'i8'), ('close', 'f8')]
+
+
+def _bars(times, closes=None):
+    if closes is None:
+        closes = [float(t) for t in times]
+    return np.array(list(zip(times, closes)), dtype=RATE_DTYPE)
+
+
+def test_forming_bar_is_replaced():
+    """The cached forming bar gives way to the fresh copy from the tail"""
+    cached = _bars([60, 120, 180], [1.0, 2.0, 3.0])
+    tail = _bars([120, 180], [2.0, 3.5])
+
+    rates = mt5_helper._splice_bars(cached, tail, 3)
+
+    assert rates['time'].tolist() == [60, 120, 180]
+    assert rates['close'].tolist() == [1.0, 2.0, 3.5]
+
+
+def test_new_bars_are_appended_and_trimmed():
+    """Bars closed since the last call are appended, keeping the last ``bars``"""
+    cached = _bars([60, 120, 180])
+    tail = _bars([180, 240, 300])
+
+    rates = mt5_helper._splice_bars(cached, tail, 3)
+
+    assert rates['time'].tolist() == [180, 240, 300]
+
+
+def test_no_overlap_returns_none():
+    """A tail that starts after the cache ends can't be lined up"""
+    cached = _bars([60, 120, 180])
+
+    assert mt5_helper._splice_bars(cached, _bars([300, 360]), 3) is None
+    # A first bar missing from the cache (a gap in history) doesn't line up either
+    assert mt5_helper._splice_bars(cached, _bars([150, 180]), 3) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,77 @@
+"""
+Notification retry tests for TradeEngine
+"""
+import pytest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import notifications
+
+
+class FakeTwilioRestException(Exception):
+    def __init__(self, status, code=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.code = code
+
+
+@pytest.fixture
+def fake_twilio(monkeypatch):
+    """Stand in for twilio's exception class and record retry sleeps"""
+    monkeypatch.setattr(notifications, 'TwilioRestException', FakeTwilioRestException, raising=False)
+    monkeypatch.setattr(notifications.random, 'uniform', lambda low, high: high)
+    sleeps = []
+    monkeypatch.setattr(notifications.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def _send_with_one_429(headers):
+    """Run a send that is throttled once, choosing delays as _send_sms does
+    
+    The first recorded sleep is the retry delay; any later ones are the
+    token bucket pacing the retry.
+    """
+    calls = []
+
+    def send():
+        calls.append(1)
+        if len(calls) == 1:
+            raise FakeTwilioRestException(429)
+        return 'sent'
+
+    bucket = notifications.TokenBucket(rate=1000.0, capacity=10)
+    result = notifications._with_retries(
+        send, lambda error, attempt: notifications._twilio_retry_delay(error, attempt, headers), bucket
+    )
+    assert result == 'sent'
+    assert len(calls) == 2
+
+
+def test_429_waits_for_retry_after(fake_twilio):
+    """A throttled send waits as long as the response's Retry-After asks"""
+    _send_with_one_429({'Retry-After': '7'})
+    assert fake_twilio[0] == 7.0
+
+
+def test_429_without_retry_after_backs_off(fake_twilio):
+    """Without Retry-After the jittered exponential backoff is used"""
+    _send_with_one_429(None)
+    assert fake_twilio[0] == notifications._RETRY_BASE
+
+
+def test_retry_after_is_capped(fake_twilio):
+    """A very long Retry-After is capped at _RETRY_CAP"""
+    _send_with_one_429({'Retry-After': '3600'})
+    assert fake_twilio[0] == notifications._RETRY_CAP
+
+
+def test_client_errors_are_not_retried(fake_twilio):
+    """Other 4xx responses are raised straight away"""
+    assert notifications._twilio_retry_delay(FakeTwilioRestException(400), 0, {'Retry-After': '7'}) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
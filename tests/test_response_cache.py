@@ -0,0 +1,68 @@
+"""
+Response cache tests for TradeEngine
+"""
+import pytest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import response_cache
+
+
+@pytest.fixture
+def local_cache(monkeypatch):
+    """An empty in-process cache on a clock the test controls"""
+    clock = [1000.0]
+    monkeypatch.setattr(response_cache, '_redis', None)
+    monkeypatch.setattr(response_cache, '_local', {})
+    monkeypatch.setattr(response_cache.time, 'monotonic', lambda: clock[0])
+    return clock
+
+
+def test_entries_expire_after_ttl(local_cache):
+    """A body is served until its ttl runs out"""
+    response_cache._set('summary', b'{}', 10)
+    assert response_cache._get('summary') == b'{}'
+
+    local_cache[0] += 10
+    assert response_cache._get('summary') is None
+
+
+def test_expired_entries_are_pruned_on_write(local_cache):
+    """Writing drops entries that have already expired"""
+    response_cache._set('old', b'1', 5)
+    local_cache[0] += 5
+    response_cache._set('new', b'2', 5)
+
+    assert list(response_cache._local) == ['new']
+
+
+def test_oldest_entry_is_evicted_at_the_cap(local_cache, monkeypatch):
+    """Beyond _LOCAL_MAX_ENTRIES the least recently written key goes first"""
+    monkeypatch.setattr(response_cache, '_LOCAL_MAX_ENTRIES', 3)
+    for key in ('a', 'b', 'c'):
+        response_cache._set(key, key.encode(), 60)
+
+    # Rewriting a key makes it the newest
+    response_cache._set('a', b'a2', 60)
+    response_cache._set('d', b'd', 60)
+
+    assert list(response_cache._local) == ['c', 'a', 'd']
+    assert response_cache._get('b') is None
+    assert response_cache._get('a') == b'a2'
+
+
+def test_invalidate_drops_keys_by_prefix(local_cache):
+    """invalidate() only drops keys starting with the prefix"""
+    for key in ('analytics:summary:30d', 'analytics:daily_pnl:7', 'dashboard:summary'):
+        response_cache._set(key, b'{}', 60)
+
+    response_cache.invalidate('analytics:')
+
+    assert list(response_cache._local) == ['dashboard:summary']
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,109 @@
+"""
+Strategy indicator tests for TradeEngine
+"""
+import pytest
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import strategy
+
+
+def _sample_close(n=200, seed=42):
+    rng = np.random.default_rng(seed)
+    return 1.1 + np.cumsum(rng.normal(0, 0.001, n))
+
+
+def test_wilder_rsi_matches_pandas_reference():
+    """Wilder RSI matches an equivalent pandas ewm computation"""
+    close = _sample_close()
+    delta = pd.Series(close).diff().iloc[1:]
+    gain = delta.clip(lower=0).to_numpy()
+    loss = (-delta.clip(upper=0)).to_numpy()
+
+    # Seed with a 14-bar simple average, then smooth with alpha = 1/14
+    avg_gain = pd.Series(np.r_[gain[:14].mean(), gain[14:]]).ewm(alpha=1 / 14, adjust=False).mean().iloc[-1]
+    avg_loss = pd.Series(np.r_[loss[:14].mean(), loss[14:]]).ewm(alpha=1 / 14, adjust=False).mean().iloc[-1]
+    expected = 100 - 100 / (1 + avg_gain / avg_loss)
+
+    assert strategy._wilder_rsi(close) == pytest.approx(expected)
+
+
+def test_wilder_rsi_without_losses_is_nan():
+    """RSI is undefined (hold) when the window has no losing bars"""
+    assert np.isnan(strategy._wilder_rsi(np.arange(1.0, 40.0)))
+    assert np.isnan(strategy._wilder_rsi(np.arange(1.0, 10.0)))
+
+
+def test_cached_sma_pairs_match_fresh_computation():
+    """Incrementally advanced SMA sums match a from-scratch computation"""
+    close = _sample_close(400)
+    times = np.arange(400)
+    key = ("test-server", "EURUSD", 30)
+    strategy._INDICATOR_STATE.pop(key, None)
+
+    for end in (200, 201, 201, 205, 260, 400):
+        df = pd.DataFrame({'time': times[end - 200:end], 'close': close[end - 200:end]})
+        cached = strategy._sma_pairs(df, cache_key=key)
+        fresh = strategy._sma_pairs(df)
+        assert cached == pytest.approx(fresh)
+
+    sma10 = pd.Series(close).rolling(10).mean()
+    assert fresh[2] == pytest.approx(sma10.iloc[-1])
+    assert fresh[0] == pytest.approx(sma10.iloc[-2])
+
+
+def test_cached_signal_follows_forming_bar():
+    """A cached signal is reused only while the newest bar is unchanged"""
+    close = _sample_close(300)
+    rates = np.zeros(len(close), dtype=[('time', '<i8'), ('close', '<f8'), ('tick_volume', '<u8')])
+    rates['time'] = np.arange(len(close)) * 60
+    rates['close'] = close
+    rates['tick_volume'] = 100
+    key = ("test-server", "EURUSD", 15)
+
+    for name in strategy.get_available_strategies():
+        for end in range(200, 300):
+            window = rates[end - 200:end].copy()
+            for move in (0.0, 0.0, 0.01, -0.02):
+                window['close'][-1] += move
+                assert strategy.get_signal(window, name, cache_key=key) == strategy.get_signal(window, name)
+
+
+def test_rsi_scalping_signal_returns_valid_signal():
+    """RSI scalping returns one of the known signals"""
+    df = pd.DataFrame({'close': _sample_close()})
+    assert strategy.get_signal(df, "rsi_scalping") in ("buy", "sell", "hold")
+
+
+def test_signals_match_for_structured_array_and_dataframe():
+    """Strategies give the same signal for raw MT5 rates and a DataFrame"""
+    close = _sample_close()
+    rates = np.zeros(len(close), dtype=[('time', '<i8'), ('close', '<f8'), ('tick_volume', '<u8')])
+    rates['time'] = np.arange(len(close)) * 60
+    rates['close'] = close
+    rates['tick_volume'] = 100
+
+    for name in strategy.get_available_strategies():
+        assert strategy.get_signal(rates, name) == strategy.get_signal(pd.DataFrame(rates), name)
+
+
+def test_full_series_signals_match_bar_by_bar_signals():
+    """get_signals gives every bar the signal get_signal sees for that prefix"""
+    n = 300
+    close = 1.1 + np.cumsum(np.random.default_rng(7).normal(0, 0.003, n) + 0.002 * np.sin(np.arange(n) / 7))
+    df = pd.DataFrame({'close': close, 'tick_volume': np.random.default_rng(8).integers(50, 300, n)})
+    codes = {"buy": 1, "sell": -1, "hold": 0}
+
+    for name in strategy.get_available_strategies():
+        expected = [codes[strategy.get_signal(df.iloc[:i + 1].copy(), name)] for i in range(n)]
+        assert strategy.get_signals(df, name).tolist() == expected
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,21 +1,61 @@
+import os
 import time
 import logging
-import json
-from datetime import datetime, time as dt_time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, time as dt_time
 import MetaTrader5 as mt5
 from app import app, db, socketio
 from models import Trade, Account
 import mt5_helper
+import bot_state
 import strategy
 import risk_manager
+import json_utils
 from notifications import NotificationManager
 
+# MT5 timeframe constants by config name, resolved once at import
+_TIMEFRAMES = {
+    name: getattr(mt5, f"TIMEFRAME_{name}")
+    for name in ('M1', 'M2', 'M3', 'M4', 'M5', 'M6', 'M10', 'M12', 'M15', 'M20', 'M30',
+                 'H1', 'H2', 'H3', 'H4', 'H6', 'H8', 'H12', 'D1', 'W1', 'MN1')
+    if hasattr(mt5, f"TIMEFRAME_{name}")
+}
+
+# Last payload written per path; only touched from the _file_writer thread
+_last_written = {}
+
+def _write_json_atomic(path, data):
+    """Serialize once and replace ``path`` so readers never see a partial file
+    
+    Nothing is written when the payload matches the last one written.
+    """
+    try:
+        payload = json_utils.dumps(data, indent=True)
+        if _last_written.get(path) == payload and os.path.exists(path):
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        _last_written[path] = payload
+    except Exception as e:
+        logging.error(f"Error writing {path}: {e}")
+
+# Dashboard file writes run here, off the trading threads; one worker shared
+# by all traders keeps them in order
+_file_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dashboard-file")
+
 class Trader:
     def __init__(self, account_config, global_settings):
         self.config = account_config
         self.globals = global_settings
         self.name = self.config.get('name', str(self.config['login']))
-        self.timeframe = getattr(mt5, f"TIMEFRAME_{self.globals.get('timeframe', 'M30')}")
+        timeframe = self.globals.get('timeframe', 'M30')
+        if timeframe not in _TIMEFRAMES:
+            raise ValueError(f"Unknown timeframe: {timeframe}")
+        self.timeframe = _TIMEFRAMES[timeframe]
         self.notification_manager = NotificationManager()
         
         # Enhanced settings
@@ -24,38 +64,84 @@ class Trader:
         self.daily_loss_limit = self.config.get('daily_loss_limit', 5.0)  # Percentage
         self.enable_news_filter = self.config.get('enable_news_filter', False)
         
-    def _get_control_status(self):
-        """Check control status with enhanced error handling"""
-        try:
-            with open('control.json', 'r') as f:
-                return json.load(f).get('status', 'running')
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Create default control file
+        # Symbols are processed concurrently; opening trades is serialized so
+        # position limits are checked against an up-to-date position count
+        self.symbol_workers = max(1, int(self.globals.get('symbol_workers', 4)))
+        self._order_lock = threading.Lock()
+        
+        # Once the daily loss limit trips, trading stays off until this UTC time
+        self._loss_locked_until = None
+        
+        # Open positions grouped by symbol, fetched once per session and
+        # re-fetched before the next limit check once an order is placed
+        self._positions_by_symbol = {}
+        self._positions_stale = False
+        
+        # Socket.IO events raised during a session, sent together by _flush_emits
+        self._pending_emits = []
+        self._emit_lock = threading.Lock()
+        
+        # Trading session window, parsed once; None disables the filter
+        self._session_window = None
+        if self.globals.get("enable_time_filter", False):
             try:
-                with open('control.json', 'w') as f:
-                    json.dump({'status': 'running'}, f)
-                return 'running'
-            except Exception:
-                return 'running'
+                self._session_window = (
+                    dt_time.fromisoformat(self.globals.get("trading_start", "07:00")),
+                    dt_time.fromisoformat(self.globals.get("trading_end", "17:00"))
+                )
+            except (TypeError, ValueError) as e:
+                logging.error(f"Invalid trading session times, time filter disabled: {e}")
+        
+    def _queue_emit(self, event, data):
+        """Hold a Socket.IO event until the end of the session"""
+        with self._emit_lock:
+            self._pending_emits.append((event, data))
+    
+    def _flush_emits(self):
+        """Send the session's events as one frame
+        
+        Only the newest dashboard payload matters, so earlier ones are dropped.
+        Opened trades ride along in a single batch_update; without any, the
+        dashboard goes out as a plain dashboard_update.
+        """
+        with self._emit_lock:
+            pending, self._pending_emits = self._pending_emits, []
+        
+        dashboard = None
+        trades = []
+        for event, data in pending:
+            if event == 'dashboard_update':
+                dashboard = data
+            else:
+                trades.append(data)
+        
+        try:
+            if trades:
+                socketio.emit('batch_update', {'dashboard': dashboard, 'trades': trades})
+            elif dashboard is not None:
+                socketio.emit('dashboard_update', dashboard)
+        except Exception as e:
+            logging.error(f"[{self.name}] Error emitting session updates: {e}")
+    
+    def _get_account(self):
+        """This trader's Account row, loaded by primary key once its id is known"""
+        account_id = mt5_helper.get_account_id(self.config['login'])
+        return db.session.get(Account, account_id) if account_id is not None else None
+    
+    def _get_control_status(self):
+        """Check control status from the shared in-process state"""
+        return bot_state.get_control_status()
     
     def _update_dashboard_data(self):
         """Enhanced dashboard data update with error handling"""
         try:
             with app.app_context():
-                acc_info = mt5.account_info()
-                positions = mt5.positions_get()
+                acc_info = mt5_helper._offload(mt5.account_info)
+                positions = mt5_helper._offload(mt5.positions_get)
                 
                 if acc_info:
                     # Update account in database
-                    account = Account.query.filter_by(login=self.config['login']).first()
-                    if account:
-                        account.balance = acc_info.balance
-                        account.equity = acc_info.equity
-                        account.margin = acc_info.margin
-                        account.margin_free = acc_info.margin_free
-                        account.currency = acc_info.currency
-                        account.updated_at = datetime.utcnow()
-                        db.session.commit()
+                    mt5_helper.save_account_info(self.config['login'], acc_info)
                 
                 # Prepare dashboard data
                 dashboard_data = {'account_info': {}, 'positions': []}
@@ -85,60 +171,64 @@ class Trader:
                             'profit': pos.profit,
                             'swap': pos.swap,
                             'commission': pos.commission,
-                            'time': datetime.fromtimestamp(pos.time).isoformat()
+                            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(pos.time))
                         })
                 
-                # Write to file for backward compatibility
-                with open('dashboard_data.json', 'w') as f:
-                    json.dump(dashboard_data, f, indent=4)
+                # Keep the latest payload in memory for newly connected clients
+                bot_state.publish_dashboard(dashboard_data)
+                
+                # Write to file for backward compatibility, in the background
+                _file_writer.submit(_write_json_atomic, 'dashboard_data.json', dashboard_data)
                 
-                # Emit real-time update
-                socketio.emit('dashboard_update', dashboard_data)
+                # Sent with the session's other events by _flush_emits
+                self._queue_emit('dashboard_update', dashboard_data)
                 
         except Exception as e:
             logging.error(f"Error updating dashboard data: {e}", exc_info=True)
     
     def _in_trading_session(self):
         """Enhanced trading session check"""
-        if not self.globals.get("enable_time_filter", False):
+        if self._session_window is None:
             return True
-            
-        try:
-            now = datetime.now().time()
-            start = dt_time.fromisoformat(self.globals.get("trading_start", "07:00"))
-            end = dt_time.fromisoformat(self.globals.get("trading_end", "17:00"))
-            
-            # Handle overnight sessions
-            if start <= end:
-                return start <= now <= end
-            else:  # Overnight session (e.g., 22:00 to 06:00)
-                return now >= start or now <= end
-                
-        except Exception as e:
-            logging.error(f"Error checking trading session: {e}")
-            return True  # Default to allowing trading
+        
+        now = datetime.now().time()
+        start, end = self._session_window
+        
+        # Handle overnight sessions
+        if start <= end:
+            return start <= now <= end
+        else:  # Overnight session (e.g., 22:00 to 06:00)
+            return now >= start or now <= end
     
     def _check_daily_loss_limit(self):
-        """Check if daily loss limit has been reached"""
+        """Check if daily loss limit has been reached
+        
+        A reached limit holds until the next UTC midnight without querying again.
+        """
+        now = datetime.utcnow()
+        if self._loss_locked_until is not None and now < self._loss_locked_until:
+            return True
+        
         try:
             with app.app_context():
-                today = datetime.utcnow().date()
-                account = Account.query.filter_by(login=self.config['login']).first()
+                today_start = datetime.combine(now.date(), dt_time.min)
+                account = self._get_account()
                 
                 if not account:
                     return False
                 
-                # Get today's closed trades
-                today_trades = Trade.query.filter(
+                # Sum today's closed losses in SQL; a close_time range instead of
+                # date(close_time) lets the (account_id, status, close_time) index apply
+                total_loss = Trade.stats(
                     Trade.account_id == account.id,
                     Trade.status == 'CLOSED',
-                    db.func.date(Trade.close_time) == today
-                ).all()
-                
-                total_loss = sum(trade.profit for trade in today_trades if trade.profit < 0)
-                loss_percentage = abs(total_loss) / account.balance * 100
+                    Trade.close_time >= today_start,
+                    Trade.close_time < today_start + timedelta(days=1)
+                )['gross_loss']
+                loss_percentage = total_loss / account.balance * 100
                 
                 if loss_percentage >= self.daily_loss_limit:
+                    self._loss_locked_until = today_start + timedelta(days=1)
                     logging.warning(f"Daily loss limit reached: {loss_percentage:.2f}%")
                     self.notification_manager.send_error_notification(
                         f"Daily loss limit reached for account {self.name}: {loss_percentage:.2f}%"
@@ -151,18 +241,28 @@ class Trader:
             logging.error(f"Error checking daily loss limit: {e}")
             return False
     
+    def _load_positions(self):
+        """Fetch all open positions in one call and group them by symbol"""
+        positions_by_symbol = defaultdict(list)
+        for position in mt5_helper.get_open_positions():
+            positions_by_symbol[position.symbol].append(position)
+        self._positions_by_symbol = positions_by_symbol
+        self._positions_stale = False
+    
     def _check_position_limits(self, symbol):
         """Check position limits before opening new trades"""
         try:
-            positions = mt5_helper.get_open_positions()
+            if self._positions_stale:
+                self._load_positions()
             
             # Check total positions limit
-            if len(positions) >= self.max_total_positions:
-                logging.info(f"Maximum total positions limit reached: {len(positions)}")
+            total_positions = sum(map(len, self._positions_by_symbol.values()))
+            if total_positions >= self.max_total_positions:
+                logging.info(f"Maximum total positions limit reached: {total_positions}")
                 return False
             
             # Check per-symbol position limit
-            symbol_positions = [pos for pos in positions if pos.symbol == symbol]
+            symbol_positions = self._positions_by_symbol.get(symbol, [])
             if len(symbol_positions) >= self.max_positions_per_symbol:
                 logging.info(f"Maximum positions for {symbol} reached: {len(symbol_positions)}")
                 return False
@@ -181,11 +281,11 @@ class Trader:
         if self._get_control_status() == 'paused':
             logging.warning(f"Bot is PAUSED by user command. Skipping trading cycle for {self.name}.")
             try:
-                mt5_helper.initialize_mt5(self.config['login'], self.config['password'], self.config['server'])
+                mt5_helper.connection_pool.get(self.config['login'], self.config['password'], self.config['server'])
                 self._update_dashboard_data()
-                mt5_helper.shutdown_mt5()
             except Exception as e:
                 logging.error(f"[{self.name}] Failed to update dashboard while paused: {e}")
+            self._flush_emits()
             return
         
         # Check daily loss limit
@@ -196,8 +296,10 @@ class Trader:
         logging.info(f"--- Starting session for account: {self.name} ---")
         
         try:
-            # Initialize MT5 connection
-            mt5_helper.initialize_mt5(self.config['login'], self.config['password'], self.config['server'])
+            # Reuse the pooled MT5 connection, logging in only if needed
+            mt5_helper.connection_pool.get(self.config['login'], self.config['password'], self.config['server'])
+            mt5_helper.clear_symbol_info_cache()
+            self._load_positions()
             
         except RuntimeError as e:
             logging.error(f"[{self.name}] MT5 initialization failed: {e}")
@@ -207,28 +309,21 @@ class Trader:
             return
         
         try:
-            # Update dashboard data
-            self._update_dashboard_data()
-            
             # Check trading session
             if not self._in_trading_session():
                 logging.info(f"[{self.name}] Outside of trading session. Only managing existing positions.")
                 self._manage_existing_positions_only()
+                self._update_dashboard_data()
                 return
             
-            # Process each symbol
-            for symbol in self.config.get("symbols", []):
-                try:
-                    self._process_symbol(symbol)
-                except Exception as e:
-                    logging.error(f"[{self.name}/{symbol}] Error processing symbol: {e}", exc_info=True)
-                    
-                    # Send notification for symbol-specific errors
-                    self.notification_manager.send_error_notification(
-                        f"Error processing {symbol} on account {self.name}: {str(e)}"
-                    )
+            # Process symbols concurrently; MT5 calls release the GIL while waiting on the terminal
+            symbols = self.config.get("symbols", [])
+            if symbols:
+                with ThreadPoolExecutor(max_workers=min(self.symbol_workers, len(symbols)),
+                                        thread_name_prefix=f"symbols-{self.name}") as executor:
+                    list(executor.map(self._process_symbol_safe, symbols))
             
-            # Final dashboard update
+            # One dashboard update per session, after any trades were placed
             self._update_dashboard_data()
             
             session_duration = datetime.utcnow() - session_start_time
@@ -241,68 +336,100 @@ class Trader:
             )
             
         finally:
-            mt5_helper.shutdown_mt5()
+            self._flush_emits()
             logging.info(f"--- Session finished for account: {self.name} ---")
     
     def _manage_existing_positions_only(self):
         """Manage existing positions without opening new ones"""
         try:
             for symbol in self.config.get("symbols", []):
-                positions = mt5_helper.get_open_positions(symbol)
+                positions = self._positions_by_symbol.get(symbol)
+                if not positions:
+                    continue
+                
+                symbol_info = mt5_helper.get_symbol_info(symbol)
+                tick = mt5_helper.get_tick(symbol)
+                updates = []
                 for position in positions:
-                    self._manage_position(position)
+                    self._manage_position(position, symbol_info, tick, updates)
+                risk_manager.save_sltp_updates(updates)
                     
         except Exception as e:
             logging.error(f"Error managing existing positions: {e}")
     
+    def _process_symbol_safe(self, symbol):
+        """Process one symbol in a worker thread, reporting any failure"""
+        try:
+            with app.app_context():
+                self._process_symbol(symbol)
+        except Exception as e:
+            logging.error(f"[{self.name}/{symbol}] Error processing symbol: {e}", exc_info=True)
+            
+            # Send notification for symbol-specific errors
+            self.notification_manager.send_error_notification(
+                f"Error processing {symbol} on account {self.name}: {str(e)}"
+            )
+    
     def _process_symbol(self, symbol):
         """Enhanced symbol processing with comprehensive checks"""
         logging.info(f"[{self.name}/{symbol}] Processing...")
         
         try:
-            # Get open positions for this symbol
-            open_positions = mt5_helper.get_open_positions(symbol)
+            # Symbol info is memoized per session; fetch the tick only once
+            symbol_info = mt5_helper.get_symbol_info(symbol)
+            
+            # Open positions for this symbol, from the session snapshot
+            open_positions = self._positions_by_symbol.get(symbol, [])
             
             # Manage existing positions
-            for position in open_positions:
-                self._manage_position(position)
+            if open_positions:
+                tick = mt5_helper.get_tick(symbol)
+                updates = []
+                for position in open_positions:
+                    self._manage_position(position, symbol_info, tick, updates)
+                risk_manager.save_sltp_updates(updates)
             
             # Get market data
-            df = mt5_helper.get_data(symbol, self.timeframe, bars=200)
+            rates = mt5_helper.get_data(symbol, self.timeframe, bars=200)
             
-            if df is None or len(df) < 50:
-                logging.warning(f"[{self.name}/{symbol}] Insufficient market data (got {len(df) if df is not None else 0} bars)")
+            if rates is None or len(rates) < 50:
+                logging.warning(f"[{self.name}/{symbol}] Insufficient market data (got {len(rates) if rates is not None else 0} bars)")
                 return
             
             # Generate trading signal
-            signal = strategy.get_signal(df, self.config.get("strategy_name", "sma_crossover"))
-            last_price = df['close'].iloc[-1]
+            signal = strategy.get_signal(
+                rates,
+                self.config.get("strategy_name", "sma_crossover"),
+                cache_key=(self.config['server'], symbol, self.timeframe)
+            )
+            last_price = rates['close'][-1]
             
             logging.info(f"[{self.name}/{symbol}] Last Price: {last_price}, Signal: {signal}")
             
             # Check if we can open new positions
             if signal in ("buy", "sell") and len(open_positions) == 0:
-                if self._check_position_limits(symbol):
-                    self._execute_trade(symbol, signal, df, last_price)
-                else:
-                    logging.info(f"[{self.name}/{symbol}] Position limits prevent new trade")
+                with self._order_lock:
+                    if self._check_position_limits(symbol):
+                        self._execute_trade(symbol, signal, rates, last_price, symbol_info)
+                    else:
+                        logging.info(f"[{self.name}/{symbol}] Position limits prevent new trade")
             
         except Exception as e:
             logging.error(f"[{self.name}/{symbol}] Exception in _process_symbol: {e}", exc_info=True)
     
-    def _manage_position(self, position):
+    def _manage_position(self, position, symbol_info=None, tick=None, pending_updates=None):
         """Enhanced position management"""
         try:
             symbol = position.symbol
             logging.debug(f"[{self.name}/{symbol}] Managing position #{position.ticket}")
             
-            # Update trailing stop
-            trail_pips = self.config.get('trailing_stop_pips', 20)
-            risk_manager.update_trailing_stop(position, symbol, trail_pips=trail_pips)
-            
-            # Move to breakeven if profitable
-            breakeven_pips = self.config.get('breakeven_pips', 15)
-            risk_manager.move_sl_to_breakeven(position, symbol, profit_threshold_pips=breakeven_pips)
+            # Trailing stop and breakeven, sent as a single SL modification
+            risk_manager.manage_position(
+                position, symbol_info, tick,
+                trail_pips=self.config.get('trailing_stop_pips', 20),
+                breakeven_pips=self.config.get('breakeven_pips', 15),
+                pending_updates=pending_updates
+            )
             
             # Additional position management rules can be added here
             # e.g., time-based exits, partial closes, etc.
@@ -310,30 +437,33 @@ class Trader:
         except Exception as e:
             logging.error(f"Error managing position {position.ticket}: {e}")
     
-    def _execute_trade(self, symbol, signal, df, last_price):
+    def _execute_trade(self, symbol, signal, rates, last_price, symbol_info=None):
         """Enhanced trade execution with comprehensive risk management"""
         try:
+            # Get symbol info for price calculations
+            if symbol_info is None:
+                symbol_info = mt5_helper.get_symbol_info(symbol)
+            if not symbol_info:
+                logging.error(f"[{self.name}/{symbol}] Could not get symbol info")
+                return
+            
             # Get dynamic SL/TP
-            sl_pips, tp_pips = risk_manager.get_dynamic_sltp(df, symbol)
+            sl_pips, tp_pips = risk_manager.get_dynamic_sltp(rates, symbol, symbol_info=symbol_info)
             
             # Calculate position size
             volume = risk_manager.calculate_volume(
                 symbol, 
                 sl_pips, 
                 self.config['risk_percent'], 
-                self.config['max_volume']
+                self.config['max_volume'],
+                symbol_info=symbol_info,
+                account_info=mt5_helper._offload(mt5.account_info)
             )
             
             if volume <= 0:
                 logging.warning(f"[{self.name}/{symbol}] Invalid volume calculated: {volume}")
                 return
             
-            # Get symbol info for price calculations
-            symbol_info = mt5.symbol_info(symbol)
-            if not symbol_info:
-                logging.error(f"[{self.name}/{symbol}] Could not get symbol info")
-                return
-            
             # Calculate SL/TP prices
             if signal == "buy":
                 sl = last_price - (sl_pips * symbol_info.point)
@@ -343,7 +473,7 @@ class Trader:
                 tp = last_price - (tp_pips * symbol_info.point)
             
             # Validate prices
-            if not self._validate_trade_prices(symbol, signal, last_price, sl, tp):
+            if not self._validate_trade_prices(symbol, signal, last_price, sl, tp, symbol_info):
                 logging.warning(f"[{self.name}/{symbol}] Trade prices validation failed")
                 return
             
@@ -366,9 +496,10 @@ class Trader:
             
             if result:
                 logging.info(f"[{self.name}/{symbol}] Trade executed successfully. Ticket: {result.order}")
+                self._positions_stale = True
                 
-                # Emit real-time notification
-                socketio.emit('trade_opened', {
+                # Real-time notification, sent at the end of the session
+                self._queue_emit('trade_opened', {
                     'account': self.name,
                     'symbol': symbol,
                     'type': signal.upper(),
@@ -385,30 +516,26 @@ class Trader:
         except Exception as e:
             logging.error(f"[{self.name}/{symbol}] Exception in _execute_trade: {e}", exc_info=True)
     
-    def _validate_trade_prices(self, symbol, signal, entry_price, sl, tp):
+    def _validate_trade_prices(self, symbol, signal, entry_price, sl, tp, symbol_info=None):
         """Validate trade prices before execution"""
         try:
-            symbol_info = mt5.symbol_info(symbol)
+            if symbol_info is None:
+                symbol_info = mt5_helper.get_symbol_info(symbol)
             if not symbol_info:
                 return False
             
             # Check minimum distance from current price
             min_distance = symbol_info.trade_stops_level * symbol_info.point
             
-            if signal == "buy":
-                if abs(entry_price - sl) < min_distance:
-                    logging.warning(f"SL too close to entry price for {symbol}")
-                    return False
-                if tp <= entry_price:
-                    logging.warning(f"Invalid TP for buy order on {symbol}")
-                    return False
-            else:  # sell
-                if abs(entry_price - sl) < min_distance:
-                    logging.warning(f"SL too close to entry price for {symbol}")
-                    return False
-                if tp >= entry_price:
-                    logging.warning(f"Invalid TP for sell order on {symbol}")
-                    return False
+            if abs(entry_price - sl) < min_distance:
+                logging.warning(f"SL too close to entry price for {symbol}")
+                return False
+            
+            # TP must lie above entry for a buy and below it for a sell
+            direction = 1 if signal == "buy" else -1
+            if (tp - entry_price) * direction <= 0:
+                logging.warning(f"Invalid TP for {signal} order on {symbol}")
+                return False
             
             return True
             
@@ -1,10 +1,17 @@
+import atexit
 import json
+import queue
+import random
 import time
 import logging
+import logging.handlers
 import threading
 from datetime import datetime
+from sqlalchemy import insert
 from app import app, db, socketio
 from models import Account, Trade, SystemLog
+import bot_state
+import strategy
 try:
     from trader import Trader
 except ImportError:
@@ -31,31 +38,124 @@ except ImportError:
             pass
 from notifications import NotificationManager
 
+# Wait before retrying after a failed cycle, doubled per consecutive failure
+_RETRY_DELAY_MIN = 60
+_RETRY_DELAY_MAX = 300
+
+class DatabaseQueueHandler(logging.handlers.QueueHandler):
+    """Queue records for the database writer without blocking the caller"""
+    
+    def __init__(self, log_queue, writer):
+        super().__init__(log_queue)
+        self.writer = writer
+    
+    def prepare(self, record):
+        # Only the message is stored, so drop args and tracebacks up front
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass  # Drop rather than stall trading when the database falls behind
+    
+    def emit(self, record):
+        # Logging from the writer itself (e.g. SQL echo) would feed back forever
+        if threading.current_thread() is self.writer.thread:
+            return
+        super().emit(record)
+
+class DatabaseLogWriter:
+    """Write queued log records to SystemLog in batches"""
+    
+    _STOP = object()
+    
+    def __init__(self, log_queue, batch_size=200, max_wait=0.05):
+        self.queue = log_queue
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.thread = threading.Thread(target=self._run, name="db-log-writer", daemon=True)
+    
+    def start(self):
+        self.thread.start()
+    
+    def stop(self):
+        """Write whatever is still queued and stop the writer"""
+        if self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join(timeout=5)
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            if record is self._STOP:
+                break
+            
+            # Collect more records for up to max_wait, then write them together
+            batch = [record]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is self._STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            
+            self._write(batch)
+    
+    def _write(self, batch):
+        with app.app_context():
+            try:
+                # One executemany (multi-row VALUES where the driver supports it)
+                db.session.execute(insert(SystemLog), [
+                    {'level': record.levelname, 'message': record.msg, 'module': record.module}
+                    for record in batch
+                ])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()  # Never log from here; it would queue more work
+
 class TradingEngine:
     def __init__(self):
         self.config = self.load_config()
+        bot_state.ensure_control_file()
         self.running = False
+        # Set by stop() to cut the sleep between cycles short; waiting on it
+        # yields to the hub when eventlet or gevent patch threading
+        self._stop_event = threading.Event()
+        # Traders by (login, name), reused across cycles so their caches persist
+        self._traders = {}
         self.notification_manager = NotificationManager()
         self.setup_logging()
+        strategy.warm_up()
     
     def setup_logging(self):
-        """Setup database logging handler"""
-        class DatabaseHandler(logging.Handler):
-            def emit(self, record):
-                with app.app_context():
-                    try:
-                        log_entry = SystemLog()
-                        log_entry.level = record.levelname
-                        log_entry.message = record.getMessage()
-                        log_entry.module = record.module if hasattr(record, 'module') else record.name
-                        db.session.add(log_entry)
-                        db.session.commit()
-                    except Exception:
-                        pass  # Avoid infinite recursion in logging
+        """Setup queued database logging
+        
+        Records are put on a queue by the logging thread and written to
+        SystemLog by a background writer, one commit per batch, so logging
+        never waits on the database. The writer is drained at interpreter exit.
+        """
+        log_queue = queue.Queue(maxsize=10000)
+        self.log_writer = DatabaseLogWriter(log_queue)
+        self.log_writer.start()
+        atexit.register(self.log_writer.stop)
         
-        db_handler = DatabaseHandler()
-        db_handler.setLevel(logging.INFO)
-        logging.getLogger().addHandler(db_handler)
+        self.db_log_handler = DatabaseQueueHandler(log_queue, self.log_writer)
+        self.db_log_handler.setLevel(logging.INFO)
+        logging.getLogger().addHandler(self.db_log_handler)
     
     def load_config(self):
         """Load configuration from file"""
@@ -71,11 +171,7 @@ class TradingEngine:
     
     def get_control_status(self):
         """Check if trading is paused"""
-        try:
-            with open('control.json', 'r') as f:
-                return json.load(f).get('status', 'running')
-        except (FileNotFoundError, json.JSONDecodeError):
-            return 'running'
+        return bot_state.get_control_status()
     
     def sync_accounts(self):
         """Sync accounts from config to database"""
@@ -100,36 +196,46 @@ class TradingEngine:
     def start(self):
         """Start the trading engine"""
         self.running = True
+        self._stop_event.clear()
         self.sync_accounts()
         
+        retry_delay = _RETRY_DELAY_MIN
         while self.running:
             try:
                 if self.get_control_status() == 'paused':
                     logging.info("Trading engine is paused")
-                    time.sleep(30)
+                    self._stop_event.wait(30)
                     continue
                 
                 self.run_trading_cycle()
+                retry_delay = _RETRY_DELAY_MIN
                 
                 sleep_interval = self.config.get("global_settings", {}).get("sleep_seconds", 300)
                 logging.info(f"Trading cycle complete. Sleeping for {sleep_interval} seconds.")
-                time.sleep(sleep_interval)
+                self._stop_event.wait(sleep_interval)
                 
             except Exception as e:
                 logging.error(f"Error in trading engine: {e}", exc_info=True)
-                time.sleep(60)  # Wait a minute before retrying
+                
+                # Back off while errors persist, with jitter so retries spread out
+                self._stop_event.wait(retry_delay + random.uniform(0, retry_delay / 4))
+                retry_delay = min(_RETRY_DELAY_MAX, retry_delay * 2)
     
     def run_trading_cycle(self):
         """Run one complete trading cycle"""
         with app.app_context():
             logging.info("Starting new trading cycle...")
             
+            # Accounts run one after another: the MT5 terminal is logged in to a
+            # single account per process (see mt5_helper.ConnectionPool), so
+            # concurrent sessions would switch logins under each other. Symbols
+            # within a session are already processed in parallel.
             for account_config in self.config.get("accounts", []):
                 if not account_config.get("enabled", False):
                     continue
                 
                 try:
-                    trader = Trader(account_config, self.config.get("global_settings", {}))
+                    trader = self._get_trader(account_config)
                     if hasattr(trader, 'run_session'):
                         trader.run_session()
                     else:
@@ -153,25 +259,27 @@ class TradingEngine:
                         f"Trading error on account {account_config['login']}: {str(e)}"
                     )
     
+    def _get_trader(self, account_config):
+        """Trader for this account, created on first use"""
+        key = (account_config['login'], account_config.get('name'))
+        trader = self._traders.get(key)
+        if trader is None:
+            trader = Trader(account_config, self.config.get("global_settings", {}))
+            self._traders[key] = trader
+        return trader
+    
     def update_account_info(self, login):
         """Update account information in database"""
         try:
             import MetaTrader5 as mt5
+            import mt5_helper
             
             if mt5.terminal_info() is None:
                 return
             
             account_info = mt5.account_info()
             if account_info:
-                account = Account.query.filter_by(login=login).first()
-                if account:
-                    account.balance = account_info.balance
-                    account.equity = account_info.equity
-                    account.margin = account_info.margin
-                    account.margin_free = account_info.margin_free
-                    account.currency = account_info.currency
-                    account.updated_at = datetime.utcnow()
-                    db.session.commit()
+                mt5_helper.save_account_info(login, account_info)
         except ImportError:
             # MetaTrader5 not available in development environment
             logging.debug(f"MT5 not available, skipping account info update for {login}")
@@ -180,4 +288,5 @@ class TradingEngine:
     def stop(self):
         """Stop the trading engine"""
         self.running = False
+        self._stop_event.set()
         logging.info("Trading engine stopped")
@@ -1,13 +1,18 @@
 from flask_socketio import emit, disconnect
 from app import socketio, app
-import json
 import logging
+import bot_state
 
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
     logging.info("Client connected to WebSocket")
     emit('status', {'status': 'connected'})
+    
+    # Send the latest dashboard state right away instead of waiting for a cycle
+    dashboard_data = bot_state.get_dashboard()
+    if dashboard_data:
+        emit('dashboard_update', dashboard_data)
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -25,9 +30,7 @@ def handle_subscribe(data):
 def handle_bot_status():
     """Get current bot status"""
     try:
-        with open('control.json', 'r') as f:
-            status = json.load(f).get('status', 'running')
-        emit('bot_status', {'status': status})
+        emit('bot_status', {'status': bot_state.get_control_status()})
     except Exception:
         emit('bot_status', {'status': 'unknown'})
 